@@ -142,16 +142,19 @@ def run(settings_from_json, logger, p4):
             redirector_deleter_i.add_to_check(redirector_object)
 
             #Now that we have all the necessary elements, we will go ahead and clean up redirectors.
+            #referencers are gathered first so that their files can be checked out together.
+            referencers_to_fix = []
+
             for redirector_referencer in redirector_referencers:
 
                 referencer_objects = asset_registry.get_assets_by_package_name(redirector_referencer)
 
                 if len(referencer_objects) > 1 and not ue_asset_lib.assets_class_only_test(referencer_objects, "ObjectRedirector"):
 
-                    logger.log_ue("Skipping redirector because it's referencer package ({}) contains more than 1 asset. Assets should be split up into individual packages.".format(referencer_object,))
+                    logger.log_ue("Skipping redirector because it's referencer package ({}) contains more than 1 asset. Assets should be split up into individual packages.".format(redirector_referencer))
                     break
                 else:
-                    referencer_object = referencer_object[0]
+                    referencer_object = referencer_objects[0]
 
                 referencer_object_path = ue_asset_lib.get_object_path(referencer_object)
 
@@ -167,40 +170,19 @@ def run(settings_from_json, logger, p4):
                 # logger.log_ue("asset: {}".format(referencer_asset))
                 # logger.log_ue("asset path: {}".format(referencer_sys_path))
 
+                referencers_to_fix.append((referencer_object, referencer_object_path, referencer_asset, referencer_sys_path, referencer_package))
+
+            p4.prefetch_file_status([x[3] for x in referencers_to_fix])
+
+            files_to_check_out = []
+
+            for referencer_object, referencer_object_path, referencer_asset, referencer_sys_path, referencer_package in referencers_to_fix:
+
                 if p4.is_file_in_depot(referencer_sys_path):
 
                     if p4.is_file_available_for_checkout(referencer_sys_path):
 
-                        try:
-                            checked_out = False
-
-                            #create changelist if one does not exist
-                            if not changelist_num:
-                                changelist_num = p4.create_changelist("Igby Redirector Cleaner")
-                            
-                            if changelist_num:
-                                checked_out = p4.check_out_file(referencer_sys_path, changelist_num)
-                            else:
-                                logger.log_ue("Could not create a changelist.")
-
-                            if checked_out:
-                                logger.log_ue("Remapping!")
-                                unreal.EditorAssetLibrary.load_asset(referencer_object_path)
-                                unreal.EditorAssetLibrary.save_loaded_asset(referencer_asset, False)#save to fix hard references
-                                fix_up_soft_object_paths(referencer_package, redirector_object, redirector_target_object)
-                                unreal.EditorAssetLibrary.save_loaded_asset(referencer_asset, False)#save again after fixing soft references
-                                asset_registry.scan_modified_asset_files([referencer_object.package_name])
-
-                        except Exception as e:
-
-                            if changelist_num in p4.get_client_changelists():
-                                logger.log_ue("Error Detected! {}\nReverting Files and Deleting Changelist: {}".format(e, changelist_num), "error_clr")
-                                p4.revert_changelist_files(changelist_num)
-                                p4.delete_changelist(changelist_num)
-
-                            #if something fails, revert files and delete CL.
-                            error_message = traceback.format_exc()
-                            raise Exception(error_message)
+                        files_to_check_out.append(referencer_sys_path)
 
                     else:
 
@@ -211,6 +193,41 @@ def run(settings_from_json, logger, p4):
 
                     logger.log_ue("File not in depot: {}".format(referencer_sys_path))
 
+            if len(files_to_check_out):
+
+                try:
+                    checked_out = {}
+
+                    #create changelist if one does not exist
+                    if not changelist_num:
+                        changelist_num = p4.create_changelist("Igby Redirector Cleaner")
+                    
+                    if changelist_num:
+                        checked_out = p4.check_out_files(files_to_check_out, changelist_num)
+                    else:
+                        logger.log_ue("Could not create a changelist.")
+
+                    for referencer_object, referencer_object_path, referencer_asset, referencer_sys_path, referencer_package in referencers_to_fix:
+
+                        if checked_out.get(referencer_sys_path, False):
+                            logger.log_ue("Remapping: {}".format(referencer_object_path))
+                            unreal.EditorAssetLibrary.load_asset(referencer_object_path)
+                            unreal.EditorAssetLibrary.save_loaded_asset(referencer_asset, False)#save to fix hard references
+                            fix_up_soft_object_paths(referencer_package, redirector_object, redirector_target_object)
+                            unreal.EditorAssetLibrary.save_loaded_asset(referencer_asset, False)#save again after fixing soft references
+                            asset_registry.scan_modified_asset_files([referencer_object.package_name])
+
+                except Exception as e:
+
+                    if changelist_num in p4.get_client_changelists():
+                        logger.log_ue("Error Detected! {}\nReverting Files and Deleting Changelist: {}".format(e, changelist_num), "error_clr")
+                        p4.revert_changelist_files(changelist_num)
+                        p4.delete_changelist(changelist_num)
+
+                    #if something fails, revert files and delete CL.
+                    error_message = traceback.format_exc()
+                    raise Exception(error_message)
+
     logger.prefix = "    "
     logger.log_ue("")
 
@@ -327,6 +344,8 @@ class redirector_deleter():
 
             self.logger.log_ue("Deleting {} unused redirectors:\n".format(to_delete_count))
 
+            redirector_system_paths = {}
+
             for redirector in self.redirectors_to_delete:
 
                 redirector_object_path = ue_asset_lib.get_object_path(redirector)
@@ -335,24 +354,35 @@ class redirector_deleter():
 
                 if self.p4.is_file_available_for_checkout(redirector_system_path):
 
-                    if self.p4.check_out_file(redirector_system_path, changelist):
+                    redirector_system_paths[redirector_system_path] = redirector_object_path
 
-                        if unreal.EditorAssetLibrary.delete_asset(redirector_object_path):
+                else:
 
-                            self.p4.move_to_changelist([redirector_system_path], changelist)
-                            self.logger.log_ue("Deleted: {}".format(redirector_object_path))
+                    file_owner = self.p4.get_file_owner(redirector_system_path)
+                    self.logger.log_ue("Warning! Perforce file {} is already checked out by: {}".format(redirector_object_path, file_owner), "warning_clr")
 
-                        else:
+            #check out all redirectors with a single perforce command.
+            checked_out = self.p4.check_out_files(list(redirector_system_paths.keys()), changelist)
+            deleted_system_paths = []
 
-                            self.logger.log_ue("Warning! Redirector can't be deleted: {}".format(redirector_object_path), "warning_clr")
-                    else:
+            for redirector_system_path, redirector_object_path in redirector_system_paths.items():
+
+                if checked_out[redirector_system_path]:
 
-                        self.logger.log_ue("Warning! Perforce file can't be checked out: {}".format(redirector_object_path), "warning_clr")
+                    if unreal.EditorAssetLibrary.delete_asset(redirector_object_path):
 
+                        deleted_system_paths.append(redirector_system_path)
+                        self.logger.log_ue("Deleted: {}".format(redirector_object_path))
+
+                    else:
+
+                        self.logger.log_ue("Warning! Redirector can't be deleted: {}".format(redirector_object_path), "warning_clr")
                 else:
 
-                    file_owner = self.p4.get_file_owner(redirector_system_path)
-                    self.logger.log_ue("Warning! Perforce file {} is already checked out by: {}".format(redirector_object_path, file_owner), "warning_clr")
+                    self.logger.log_ue("Warning! Perforce file can't be checked out: {}".format(redirector_object_path), "warning_clr")
+
+            if len(deleted_system_paths):
+                self.p4.move_to_changelist(deleted_system_paths, changelist)
 
 
     def list(self):
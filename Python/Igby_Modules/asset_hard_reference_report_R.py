@@ -2,7 +2,7 @@
 # Developed by Richard Greenspan | rg.igby@gmail.com
 # Licensed under the MIT license. See LICENSE file in the project root for details.
 
-import os, igby_lib, ue_asset_lib, module_settings
+import igby_lib, ue_asset_lib, module_settings
 
 def run(settings_from_json, logger, p4):
 
@@ -24,45 +24,21 @@ def run(settings_from_json, logger, p4):
     logger.log_ue("To reduce the hard reference chain size, remove hard references or replace them with soft references.\n", "info_clr")
 
     #logic
-    asset_memory_lookup = dict()
     asset_hard_ref_mem = list()
 
     filtered_assets = ue_asset_lib.get_assets(settings["PATHS_TO_INCLUDE"], settings["PATHS_TO_IGNORE"], True)
 
-    progress_bar = igby_lib.long_process(len(filtered_assets), logger)
-
-    for asset in filtered_assets:
-
-        #skipping world assets because we are primarely looking for non world assets.
-        if ue_asset_lib.get_asset_class(asset) == 'World':
-            continue
-
-        deps = ue_asset_lib.get_connections(asset, "dependencies", False, True, True)
-        deps.append(asset.package_name)
-        #remove duplicates
-        deps = [set(deps)]
-
-        total_memory = 0
-        total_ref_count = 0
+    #skipping world assets because we are primarely looking for non world assets.
+    filtered_assets = [x for x in filtered_assets if ue_asset_lib.get_asset_class(x) != 'World']
 
-        for package_name in deps:
+    #hard reference chain sizes of all assets are computed together from the dependency graph.
+    closure_sizes = ue_asset_lib.get_dependency_closure_sizes([x.package_name for x in filtered_assets], False, True)
 
-            if str(package_name).startswith("/Game/"):
-
-                package_name_hash = hash(package_name)
-
-                if package_name_hash not in asset_memory_lookup:
-
-                    package_system_path = ue_asset_lib.get_package_system_path(package_name)
+    progress_bar = igby_lib.long_process(len(filtered_assets), logger)
 
-                    if package_system_path:
-                        size = os.path.getsize(package_system_path)
-                        asset_memory_lookup[package_name_hash] = size
-                    else:
-                        continue
+    for asset in filtered_assets:
 
-                total_memory += asset_memory_lookup[package_name_hash]
-                total_ref_count += 1
+        total_ref_count, total_memory = closure_sizes[str(asset.package_name)]
 
         disk_size = int(total_memory/1000000.0)
         asset_class = ue_asset_lib.get_asset_class(asset)
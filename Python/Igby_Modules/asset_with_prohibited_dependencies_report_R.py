@@ -9,6 +9,7 @@ def run(settings_from_json, logger, p4):
     #settings
     module_settings_definition = {}
     module_settings_definition.update({"PROHIBITED_DEPENDENCY_PATHS":{"type":"list(str)", "info":"Content folders that contain assets which should be prohibited from project assets."}})
+    module_settings_definition.update({"TRANSITIVE_DEPENDENCIES":{"type":"bool", "optional":True, "default":False, "info":"Determines if prohibited dependencies are also reported when they are only referenced through other dependencies."}})
     module_settings_definition.update(module_settings.content_path_base_settings_definition.copy())
     module_settings_definition.update(module_settings.report_module_base_settings_definition.copy())
     settings = igby_lib.validate_settings(settings_from_json, module_settings_definition, logger)
@@ -16,7 +17,7 @@ def run(settings_from_json, logger, p4):
     #setup report
     report = igby_lib.report(settings, logger)
     report.set_log_message("The following is a list of assets and their dependencies from prohibited paths:\n")
-    report.set_column_categories(["asset", "prohibited dependency", "user", "date"])
+    report.set_column_categories(["asset", "prohibited dependency", "dependency chain", "user", "date"])
 
     #description
     logger.log_ue("Identifying packages that have dependencies from a prohibited path.\n")
@@ -38,11 +39,17 @@ def run(settings_from_json, logger, p4):
 
     assets_with_prohibited_dependencies = []
 
-    for asset in filtered_assets:
+    #transitive dependencies of all assets are resolved together from the dependency graph.
+    if settings["TRANSITIVE_DEPENDENCIES"]:
+        transitive_prohibited_deps = ue_asset_lib.get_reachable_packages([x.package_name for x in filtered_assets], prohibited_package_names, True, True)
 
-        deps = set(ue_asset_lib.get_connections(asset, "dependencies", True, True, False))
+    for asset in filtered_assets:
 
-        prohibited_deps = deps.intersection(prohibited_package_names)
+        if settings["TRANSITIVE_DEPENDENCIES"]:
+            prohibited_deps = transitive_prohibited_deps.get(str(asset.package_name), set())
+        else:
+            deps = set(ue_asset_lib.get_connections(asset, "dependencies", True, True, False))
+            prohibited_deps = deps.intersection(prohibited_package_names)
 
         if len(prohibited_deps) > 0:
 
@@ -53,7 +60,8 @@ def run(settings_from_json, logger, p4):
 
             for dep in prohibited_deps:
 
-                assets_with_prohibited_dependencies.append([object_path, dep, user, date])
+                chain = " > ".join([str(x) for x in ue_asset_lib.get_dependency_chain(asset.package_name, dep, True, True)])
+                assets_with_prohibited_dependencies.append([object_path, dep, chain, user, date])
 
         progress_bar.make_progress()
 
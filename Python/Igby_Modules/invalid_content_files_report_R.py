@@ -2,7 +2,7 @@
 # Developed by Richard Greenspan | rg.igby@gmail.com
 # Licensed under the MIT license. See LICENSE file in the project root for details.
 
-import os, unreal, igby_lib, ue_asset_lib, module_settings
+import unreal, igby_lib, ue_asset_lib, module_settings
 
 def run(settings_from_json, logger, p4):
 
@@ -43,11 +43,10 @@ def run(settings_from_json, logger, p4):
 
     local_content_files = set()
 
-    for r, d, f in os.walk(abs_content_path):
-        for file in f:
-            file_l = file.lower()
-            if file_l.endswith(".uasset") or file_l.endswith(".umap"):
-                local_content_files.add(os.path.join(r, file))
+    for file_path, size, mtime in igby_lib.get_content_manifest(abs_content_path).get_files():
+        file_l = file_path.lower()
+        if file_l.endswith(".uasset") or file_l.endswith(".umap"):
+            local_content_files.add(file_path)
 
     invalid_package_files = list(local_content_files - package_files)
     invalid_package_files.sort()
@@ -27,54 +27,47 @@ def run(settings_from_json, logger, p4):
     abs_content_path = unreal.Paths.convert_relative_path_to_full(rel_content_path).replace('/','\\')
     
     external_actor_path = f"{abs_content_path}__ExternalActors__"
-    checked_dirs = []
+    content_manifest = igby_lib.get_content_manifest(abs_content_path)
+    checked_dirs = set()
     info = []
 
-    dir_count = 0
+    dir_count = len(content_manifest.get_dirs(external_actor_path))
 
-    for r, d, f in os.walk(external_actor_path):
+    for file_path, size, mtime in content_manifest.get_files(external_actor_path):
 
-        dir_count += 1
-        for file in f:
+        file_l = file_path.lower()
 
-            file_l = file.lower()
+        if file_l.endswith(".uasset"):
 
-            if file_l.endswith(".uasset"):
+            external_level_dir = os.path.dirname(file_path).rsplit("\\",2)[0]
+            level_path = external_level_dir.replace("__ExternalActors__\\","")
+            parent_level = f"{level_path}.umap"
 
-                external_level_dir = r.rsplit("\\",2)[0]
-                level_path = external_level_dir.replace("__ExternalActors__\\","")
-                parent_level = f"{level_path}.umap"
+            if external_level_dir not in checked_dirs:
 
-                if external_level_dir not in checked_dirs:
+                most_recent_date = 0
+                disk_space = 0
+                external_actor_count = 0
 
-                    most_recent_date = 0
-                    disk_space = 0
-                    external_actor_count = 0
+                if content_manifest.get_file(parent_level) == None:
 
-                    if not os.path.isfile(parent_level):
+                    #get last update external actor info
+                    for external_actor_file_path, external_actor_file_size, external_actor_file_mtime in content_manifest.get_files(external_level_dir):
 
-                        #get last update external actor info
-                        for r2, d2, f2 in os.walk(external_level_dir):
+                        actor_file_date = p4.get_file_date(external_actor_file_path, "last", False)
 
-                            for external_actor_file in f2:
+                        if actor_file_date > most_recent_date:
+                            most_recent_date = actor_file_date
+                            most_recent_actor_system_path = external_actor_file_path
 
-                                external_actor_file_path = (os.path.join(r2, external_actor_file))
-                                actor_file_date = p4.get_file_date(external_actor_file_path, "last", False)
+                        disk_space += external_actor_file_size / 1048576.0
+                        external_actor_count+=1
 
-                                if actor_file_date > most_recent_date:
-                                    most_recent_date = actor_file_date
-                                    most_recent_actor_system_path = external_actor_file_path
-
-                                disk_space += igby_lib.get_file_disk_size(external_actor_file_path, "mb")
-                                external_actor_count+=1
-
-                        date = p4.get_file_date(most_recent_actor_system_path)
-                        user = p4.get_file_user(most_recent_actor_system_path, "last")
-                        info.append([external_level_dir, external_actor_count, disk_space, date, user])
-                    
-                    checked_dirs.append(external_level_dir)
-
-                break
+                    date = p4.get_file_date(most_recent_actor_system_path)
+                    user = p4.get_file_user(most_recent_actor_system_path, "last")
+                    info.append([external_level_dir, external_actor_count, disk_space, date, user])
+                
+                checked_dirs.add(external_level_dir)
 
     logger.log_ue(f"Scanned {dir_count} directories.\n")
 
@@ -44,6 +44,19 @@ def run(settings_from_json, logger, p4):
 
     logger.log(f"Identified {len(all_filtered_redirector_packages)} Redirectors:")
 
+    #prefetch perforce state of every file that may need to be checked out or deleted.
+    files_to_prefetch = set()
+
+    for redirector_package_name in all_filtered_redirector_packages:
+
+        files_to_prefetch.add(ue_asset_lib.get_package_system_path(redirector_package_name))
+
+        for redirector_referencer in asset_registry.get_referencers(redirector_package_name, dep_options) or []:
+            files_to_prefetch.add(ue_asset_lib.get_package_system_path(redirector_referencer))
+
+    files_to_prefetch.discard(None)
+    p4.prefetch_file_status(files_to_prefetch)
+
     saved_files = []
     checked_out_files = []
 
@@ -90,29 +103,24 @@ def run(settings_from_json, logger, p4):
         if len(hard_redirector_referencers) > 0:
             logger.log("Fixing Hard References.")
 
+            #check out all referencers with a single perforce command.
+            referencer_sys_paths = [ue_asset_lib.get_package_system_path(x) for x in hard_redirector_referencers]
+            files_to_check_out = [x for x in referencer_sys_paths if x not in saved_files and x not in checked_out_files]
+            changelist_num = check_out_helper(p4, logger, files_to_check_out, changelist_num, checked_out_files)
+
             #Now that we have all the necessary elements, we will go ahead and clean up hard redirectors.
-            for redirector_referencer in hard_redirector_referencers:
+            for redirector_referencer, referencer_sys_path in zip(hard_redirector_referencers, referencer_sys_paths):
 
                 saved = False
-                checked_out = False
 
                 #connect referencer to target to avoid redirector.
                 logger.log(f"Redirector Referencer: {redirector_referencer}")
 
-                referencer_sys_path = ue_asset_lib.get_package_system_path(redirector_referencer)
-
                 if referencer_sys_path in saved_files:
                     logger.log(f"Referencer already fixed up: {redirector_referencer}")
                     continue
-                
-                if referencer_sys_path not in checked_out_files:
-
-                    checked_out_info = check_out_helper(p4, logger, referencer_sys_path, changelist_num)
-                    checked_out = checked_out_info[0]
-                    changelist_num = checked_out_info[1]
 
-                    if checked_out:
-                        checked_out_files.append(referencer_sys_path)
+                checked_out = referencer_sys_path in checked_out_files
 
                 try:
                     
@@ -152,28 +160,20 @@ def run(settings_from_json, logger, p4):
 
             logger.log("Fixing Soft References.")
 
+            #check out all referencers with a single perforce command.
+            referencer_sys_paths = [ue_asset_lib.get_package_system_path(x) for x in soft_redirector_referencers]
+            files_to_check_out = [x for x in referencer_sys_paths if x not in checked_out_files]
+            changelist_num = check_out_helper(p4, logger, files_to_check_out, changelist_num, checked_out_files)
+
             #Now that we have all the necessary elements, we will go ahead and clean up soft redirectors.
-            for redirector_referencer in soft_redirector_referencers:
+            for redirector_referencer, referencer_sys_path in zip(soft_redirector_referencers, referencer_sys_paths):
 
                 saved = False
-                checked_out = False
 
                 #connect referencer to target to avoid redirector.
                 logger.log(f"Redirector Referencer: {redirector_referencer}")
 
-                referencer_sys_path = ue_asset_lib.get_package_system_path(redirector_referencer)
-
-                if referencer_sys_path not in checked_out_files:
-
-                    checked_out_info = check_out_helper(p4, logger, referencer_sys_path, changelist_num)
-                    checked_out = checked_out_info[0]
-                    changelist_num = checked_out_info[1]
-
-                    if checked_out:
-                        checked_out_files.append(referencer_sys_path)
-                else:
-
-                    checked_out = True
+                checked_out = referencer_sys_path in checked_out_files
 
                 #find redirector object
                 redirector_asset = None
@@ -309,33 +309,47 @@ def fix_up_soft_object_path(logger, referencer_package, redirector_object, redir
 
     unreal.AssetToolsHelpers.get_asset_tools().rename_referencing_soft_object_paths([referencer_package], redirector_soft_path_map)
 
-def check_out_helper(p4, logger, file, changelist_num):
-    
-    checked_out = False
+def check_out_helper(p4, logger, files, changelist_num, checked_out_files):
 
-    if p4.is_file_in_depot(file):
+    files_to_check_out = []
 
-        if p4.is_file_available_for_checkout(file):
+    for file in files:
 
-                #create changelist if one does not exist
-                if not changelist_num:
-                    changelist_num = p4.create_changelist("Igby Redirector Cleaner")
-                
-                if changelist_num:
-                    checked_out = p4.check_out_file(file, changelist_num)
+        if p4.is_file_in_depot(file):
 
-                else:
-                    logger.log("Could not create a changelist.", "warning_clr")
-        
+            if p4.is_file_available_for_checkout(file):
+
+                files_to_check_out.append(file)
+
+            else:
+
+                file_owner = p4.get_file_owner(file)
+                logger.log(f"Warning! Perforce file {file} is already checked out by: {file_owner}", "warning_clr")
         else:
 
-            file_owner = p4.get_file_owner(file)
-            logger.log(f"Warning! Perforce file {file} is already checked out by: {file_owner}", "warning_clr")
-    else:
+            logger.log(f"File not in depot: {file}", "warning_clr")
+
+    if len(files_to_check_out):
+
+        #create changelist if one does not exist
+        if not changelist_num:
+            changelist_num = p4.create_changelist("Igby Redirector Cleaner")
+
+        if changelist_num:
 
-        logger.log(f"File not in depot: {file}", "warning_clr")
+            checked_out = p4.check_out_files(files_to_check_out, changelist_num)
 
-    return [checked_out, changelist_num]
+            for file in files_to_check_out:
+
+                if checked_out[file]:
+                    checked_out_files.append(file)
+                else:
+                    logger.log(f"Could not check out: {file}", "warning_clr")
+
+        else:
+            logger.log("Could not create a changelist.", "warning_clr")
+
+    return changelist_num
 
 #class that manages redirectors that should be deleted.
 class redirector_deleter():
@@ -406,6 +420,8 @@ class redirector_deleter():
 
             self.logger.log(f"Deleting {to_delete_count} unused redirectors:\n")
 
+            files_to_delete = []
+
             for redirector in self.redirectors_to_delete:
 
                 redirector_system_path = ue_asset_lib.get_package_system_path(redirector)
@@ -414,11 +430,25 @@ class redirector_deleter():
                 
                 if self.p4.is_file_available_for_checkout(redirector_system_path):
 
-                    if not changelist_num:
+                    files_to_delete.append(redirector_system_path)
 
-                        changelist_num = self.p4.create_changelist("Igby Redirector Cleaner")
+                else:
 
-                    if self.p4.mark_for_delete(redirector_system_path, changelist_num):
+                    file_owner = self.p4.get_file_owner(redirector_system_path)
+                    self.logger.log(f"Warning! Perforce file {redirector_system_path} is already checked out by: {file_owner}", "warning_clr")
+
+            if len(files_to_delete):
+
+                if not changelist_num:
+
+                    changelist_num = self.p4.create_changelist("Igby Redirector Cleaner")
+
+                #mark all redirectors for delete with a single perforce command.
+                marked_for_delete = self.p4.mark_files_for_delete(files_to_delete, changelist_num)
+
+                for redirector_system_path in files_to_delete:
+
+                    if marked_for_delete[redirector_system_path]:
 
                         self.logger.log(f"Deleted: {redirector_system_path}")
 
@@ -426,11 +456,6 @@ class redirector_deleter():
 
                         self.logger.log(f"Warning! Redirector can't be deleted: {redirector_system_path}", "warning_clr")
 
-                else:
-
-                    file_owner = self.p4.get_file_owner(redirector_system_path)
-                    self.logger.log(f"Warning! Perforce file {redirector_system_path} is already checked out by: {file_owner}", "warning_clr")
-
         return changelist_num
 
 
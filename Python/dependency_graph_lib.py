@@ -0,0 +1,557 @@
+# dependency_graph_lib.py for Igby UE Project Automator
+# Developed by Richard Greenspan | rg.igby@gmail.com
+# Licensed under the MIT license. See LICENSE file in the project root for details.
+
+# Package dependency graph stored in compressed sparse row (CSR) layout. The graph file is memory mapped,
+# so it loads in milliseconds in the UE process as well as in tools that run outside of UE.
+
+import os, mmap, struct, hashlib, glob, time, igby_lib
+
+hard_edge = 1
+soft_edge = 2
+
+#magic, version, node count, edge count, changelist, full build time, name table size
+header_format = "<8sIIQQQQ"
+header_size = struct.calcsize(header_format)
+file_magic = b"IGBYDG01"
+
+#increment when the layout of the graph file changes.
+file_version = 2
+
+
+def get_graph_path(content_path, changelist, cache_dir = "", engine_version = ""):
+
+    if cache_dir == "":
+        cache_dir = f"{igby_lib.get_igby_dir()}/Cache"
+
+    #graphs of another engine version are never updated incrementally, since engine content isn't tracked by changelist.
+    key_hash = hashlib.md5(f"{os.path.normpath(content_path).lower()}|{engine_version}".encode()).hexdigest()[0:16]
+    graph_path = f"{cache_dir}/dependency_graph_{key_hash}_CL{changelist}.bin"
+
+    return graph_path
+
+
+def pack_graph(dependencies, changelist = 0, build_time = 0):
+
+    #dependencies: package name -> {dependency package name: edge flags}
+    #build_time: time of the full build that an incrementally updated graph is based on. 0 = now.
+    if build_time == 0:
+        build_time = int(time.time())
+
+    names = set(dependencies.keys())
+
+    for package_dependencies in dependencies.values():
+        names.update(package_dependencies.keys())
+
+    #names are sorted by their utf8 bytes so that they can be looked up with a binary search in the mapped file.
+    encoded_names = sorted([name.encode("utf-8") for name in names])
+    node_ids = {name.decode("utf-8"):i for i, name in enumerate(encoded_names)}
+    node_count = len(encoded_names)
+
+    name_offsets = [0]
+
+    for name in encoded_names:
+        name_offsets.append(name_offsets[-1] + len(name))
+
+    dependency_lists = [[] for i in range(node_count)]
+    referencer_lists = [[] for i in range(node_count)]
+
+    for package_name, package_dependencies in dependencies.items():
+
+        package_id = node_ids[package_name]
+
+        for dependency, edge_type in package_dependencies.items():
+            dependency_id = node_ids[dependency]
+            dependency_lists[package_id].append((dependency_id, edge_type))
+            referencer_lists[dependency_id].append((package_id, edge_type))
+
+    edge_count = sum([len(x) for x in dependency_lists])
+    name_table = b"".join(encoded_names)
+
+    sections = [struct.pack(header_format, file_magic, file_version, node_count, edge_count, changelist, build_time, len(name_table))]
+    sections.append(struct.pack(f"<{node_count + 1}Q", *name_offsets))
+    sections.append(pad(name_table))
+
+    for edge_lists in [dependency_lists, referencer_lists]:
+
+        edge_offsets = [0]
+        edges = []
+        edge_flags = []
+
+        for edge_list in edge_lists:
+
+            edge_list.sort()
+            edge_offsets.append(edge_offsets[-1] + len(edge_list))
+
+            for node_id, edge_type in edge_list:
+                edges.append(node_id)
+                edge_flags.append(edge_type)
+
+        sections.append(struct.pack(f"<{node_count + 1}Q", *edge_offsets))
+        sections.append(pad(struct.pack(f"<{edge_count}I", *edges)))
+        sections.append(pad(bytes(edge_flags)))
+
+    return b"".join(sections)
+
+
+def pad(data):
+
+    #sections start on 8 byte boundaries.
+    return data + bytes(-len(data) % 8)
+
+
+def get_previous_graph_path(content_path, changelist, cache_dir = "", engine_version = ""):
+
+    #returns the path of the newest graph saved for an older changelist, or "" if there isn't one.
+    graph_path = get_graph_path(content_path, changelist, cache_dir, engine_version)
+    previous_changelist = 0
+    previous_graph_path = ""
+
+    for old_graph_path in glob.glob(f"{graph_path.rsplit('_CL', 1)[0]}_CL*.bin"):
+
+        try:
+            old_changelist = int(old_graph_path.rsplit("_CL", 1)[1][:-len(".bin")])
+        except ValueError:
+            continue
+
+        if previous_changelist < old_changelist < changelist:
+            previous_changelist = old_changelist
+            previous_graph_path = old_graph_path
+
+    return previous_graph_path
+
+
+def save_graph(graph_path, graph_data):
+
+    dir_path = os.path.dirname(graph_path)
+    if not os.path.isdir(dir_path):
+        os.makedirs(dir_path)
+
+    temp_path = f"{graph_path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        f.write(graph_data)
+
+    os.replace(temp_path, graph_path)
+
+    #graphs of older changelists are not needed anymore. Files still mapped by another process are left for the next save.
+    for old_graph_path in glob.glob(f"{graph_path.rsplit('_CL', 1)[0]}_CL*.bin"):
+
+        if os.path.normpath(old_graph_path) != os.path.normpath(graph_path):
+
+            try:
+                os.remove(old_graph_path)
+            except OSError:
+                pass
+
+
+def load_graph(graph_path):
+
+    #returns None if the file is missing or was written by a different version.
+    if not os.path.isfile(graph_path):
+        return None
+
+    with open(graph_path, "rb") as f:
+
+        if os.path.getsize(graph_path) < header_size:
+            return None
+
+        graph_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    graph = csr_graph(graph_map)
+
+    if not graph.valid:
+        graph.close()
+        return None
+
+    return graph
+
+
+class csr_graph:
+
+    def __init__(self, graph_data):
+
+        self.data = graph_data
+        magic, version, self.node_count, self.edge_count, self.changelist, self.build_time, name_table_size = struct.unpack_from(header_format, graph_data, 0)
+        self.valid = magic == file_magic and version == file_version
+
+        if not self.valid:
+            return
+
+        view = memoryview(graph_data)
+        self.views = [view]
+        offset = header_size
+
+        self.name_offsets, offset = self.get_section(view, offset, (self.node_count + 1) * 8, "Q")
+        self.name_table, offset = self.get_section(view, offset, name_table_size, "B")
+
+        #index 0 holds the dependencies and index 1 the referencers of every node.
+        self.edge_offsets = []
+        self.edges = []
+        self.edge_flags = []
+
+        for i in range(2):
+
+            edge_offsets, offset = self.get_section(view, offset, (self.node_count + 1) * 8, "Q")
+            edges, offset = self.get_section(view, offset, self.edge_count * 4, "I")
+            edge_flags, offset = self.get_section(view, offset, self.edge_count, "B")
+
+            self.edge_offsets.append(edge_offsets)
+            self.edges.append(edges)
+            self.edge_flags.append(edge_flags)
+
+    def get_section(self, view, offset, size, item_format):
+
+        section_bytes = view[offset:offset + size]
+        section = section_bytes.cast(item_format)
+        self.views.extend([section_bytes, section])
+
+        return section, offset + size + (-size % 8)
+
+    def close(self):
+
+        #the views have to be released before the map can be closed.
+        for view in reversed(getattr(self, "views", [])):
+            view.release()
+
+        if hasattr(self.data, "close"):
+            self.data.close()
+
+    def get_name(self, node_id):
+
+        return bytes(self.name_table[self.name_offsets[node_id]:self.name_offsets[node_id + 1]]).decode("utf-8")
+
+    def get_node(self, package_name):
+
+        #binary search over the sorted name table. Returns -1 for packages that aren't in the graph.
+        encoded_name = str(package_name).encode("utf-8")
+        low = 0
+        high = self.node_count
+
+        while low < high:
+
+            middle = (low + high) // 2
+            middle_name = bytes(self.name_table[self.name_offsets[middle]:self.name_offsets[middle + 1]])
+
+            if middle_name < encoded_name:
+                low = middle + 1
+            elif middle_name > encoded_name:
+                high = middle
+            else:
+                return middle
+
+        return -1
+
+    def get_edges(self, node_id, referencers = False, edge_mask = hard_edge | soft_edge):
+
+        direction = 1 if referencers else 0
+        start = self.edge_offsets[direction][node_id]
+        end = self.edge_offsets[direction][node_id + 1]
+        edges = self.edges[direction]
+        edge_flags = self.edge_flags[direction]
+
+        return [edges[i] for i in range(start, end) if edge_flags[i] & edge_mask]
+
+    def get_dependencies(self):
+
+        #unpacks the graph into package name -> {dependency package name: edge flags}, the input of pack_graph.
+        names = [self.get_name(x) for x in range(self.node_count)]
+        edge_offsets = self.edge_offsets[0]
+        edges = self.edges[0]
+        edge_flags = self.edge_flags[0]
+        dependencies = {}
+
+        for node_id in range(self.node_count):
+            dependencies[names[node_id]] = {names[edges[i]]:edge_flags[i] for i in range(edge_offsets[node_id], edge_offsets[node_id + 1])}
+
+        return dependencies
+
+    def get_connected_nodes(self, node_id, referencers = False, edge_mask = hard_edge | soft_edge, recursive = True):
+
+        all_connections = set([node_id])
+        node_ids = [node_id]
+
+        while len(node_ids):
+
+            node_ids_new = []
+
+            for current_node_id in node_ids:
+
+                for connection in self.get_edges(current_node_id, referencers, edge_mask):
+
+                    if connection not in all_connections:
+                        all_connections.add(connection)
+                        node_ids_new.append(connection)
+
+            if not recursive:
+                break
+
+            node_ids = node_ids_new
+
+        all_connections.discard(node_id)
+
+        return all_connections
+
+    def get_path(self, from_node_id, to_node_id, edge_mask = hard_edge | soft_edge):
+
+        #returns the shortest list of node ids from from_node_id to to_node_id following dependencies, or an empty list.
+        #searches forward over dependencies and backward over referencers, always expanding the smaller frontier.
+        if from_node_id == to_node_id:
+            return [from_node_id]
+
+        #parents map node id -> (parent node id, distance from the search root).
+        forward_parents = {from_node_id:(-1, 0)}
+        backward_parents = {to_node_id:(-1, 0)}
+        forward_frontier = [from_node_id]
+        backward_frontier = [to_node_id]
+        meeting_node_id = -1
+
+        while len(forward_frontier) and len(backward_frontier) and meeting_node_id == -1:
+
+            expand_forward = len(forward_frontier) <= len(backward_frontier)
+            frontier = forward_frontier if expand_forward else backward_frontier
+            parents = forward_parents if expand_forward else backward_parents
+            other_parents = backward_parents if expand_forward else forward_parents
+            frontier_new = []
+            meeting_distance = 0
+
+            #the whole level is expanded so that the shortest of the meeting points is used.
+            for node_id in frontier:
+
+                distance = parents[node_id][1] + 1
+
+                for connection in self.get_edges(node_id, not expand_forward, edge_mask):
+
+                    if connection not in parents:
+
+                        parents[connection] = (node_id, distance)
+                        frontier_new.append(connection)
+
+                        if connection in other_parents and (meeting_node_id == -1 or distance + other_parents[connection][1] < meeting_distance):
+                            meeting_node_id = connection
+                            meeting_distance = distance + other_parents[connection][1]
+
+            if expand_forward:
+                forward_frontier = frontier_new
+            else:
+                backward_frontier = frontier_new
+
+        if meeting_node_id == -1:
+            return []
+
+        path = []
+        node_id = meeting_node_id
+
+        while node_id != -1:
+            path.append(node_id)
+            node_id = forward_parents[node_id][0]
+
+        path.reverse()
+        node_id = backward_parents[meeting_node_id][0]
+
+        while node_id != -1:
+            path.append(node_id)
+            node_id = backward_parents[node_id][0]
+
+        return path
+
+    def get_connections(self, package_name, referencers = True, soft_refs = False, hard_refs = True, recursive = True):
+
+        node_id = self.get_node(package_name)
+
+        if node_id == -1:
+            return []
+
+        edge_mask = (soft_edge if soft_refs else 0) | (hard_edge if hard_refs else 0)
+
+        return [self.get_name(x) for x in self.get_connected_nodes(node_id, referencers, edge_mask, recursive)]
+
+
+nonzero_byte_table = bytes([0] + [1] * 255)
+byte_bits = [[i for i in range(8) if value >> i & 1] for value in range(256)]
+
+
+def get_set_bits(bits):
+
+    #returns the indices of the set bits. Nonzero bytes are marked with one translate and then found with bytes.find,
+    #so apart from those two passes in C the cost is per set bit instead of per bit.
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    nonzero_bytes = data.translate(nonzero_byte_table)
+    set_bits = []
+    byte_index = nonzero_bytes.find(1)
+
+    while byte_index != -1:
+
+        bit_index = byte_index * 8
+
+        for i in byte_bits[data[byte_index]]:
+            set_bits.append(bit_index + i)
+
+        byte_index = nonzero_bytes.find(1, byte_index + 1)
+
+    return set_bits
+
+
+def get_strongly_connected_components(graph, edge_mask = hard_edge | soft_edge):
+
+    #iterative tarjan. Returns the component of every node and the component count.
+    #components are numbered so that a component only depends on components with a lower number.
+    node_count = graph.node_count
+    components = [-1] * node_count
+    indices = [-1] * node_count
+    low_links = [0] * node_count
+    on_stack = [False] * node_count
+    stack = []
+    index = 0
+    component_count = 0
+
+    for root in range(node_count):
+
+        if indices[root] != -1:
+            continue
+
+        work = [(root, graph.get_edges(root, False, edge_mask), 0)]
+        indices[root] = low_links[root] = index
+        index += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while len(work):
+
+            node_id, edges, edge_index = work[-1]
+
+            if edge_index < len(edges):
+
+                work[-1] = (node_id, edges, edge_index + 1)
+                edge = edges[edge_index]
+
+                if indices[edge] == -1:
+                    indices[edge] = low_links[edge] = index
+                    index += 1
+                    stack.append(edge)
+                    on_stack[edge] = True
+                    work.append((edge, graph.get_edges(edge, False, edge_mask), 0))
+                elif on_stack[edge]:
+                    low_links[node_id] = min(low_links[node_id], indices[edge])
+
+                continue
+
+            work.pop()
+
+            if len(work):
+                parent = work[-1][0]
+                low_links[parent] = min(low_links[parent], low_links[node_id])
+
+            if low_links[node_id] == indices[node_id]:
+
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    components[member] = component_count
+                    if member == node_id:
+                        break
+
+                component_count += 1
+
+    return components, component_count
+
+
+def get_component_closures(graph, components, component_count, node_bits, target_nodes, edge_mask = hard_edge):
+
+    #yields (component, closure) for the components of the target nodes, where closure is an int bitset of the node_bits
+    #of the component and every component it depends on through edge_mask edges. The graph is condensed into strongly
+    #connected components so that every closure is the union of its own nodes and the closures of its dependencies.
+
+    component_nodes = [[] for i in range(component_count)]
+    component_dependencies = [set() for i in range(component_count)]
+    referencer_counts = [0] * component_count
+
+    for node_id in range(graph.node_count):
+
+        component = components[node_id]
+        component_nodes[component].append(node_id)
+
+        for edge in graph.get_edges(node_id, False, edge_mask):
+            if components[edge] != component:
+                component_dependencies[component].add(components[edge])
+
+    for dependencies in component_dependencies:
+        for dependency in dependencies:
+            referencer_counts[dependency] += 1
+
+    target_components = set([components[x] for x in target_nodes])
+    closures = [0] * component_count
+
+    #dependencies always have a lower component number, so the components can be processed in order.
+    #closures are released as soon as every referencing component has used them.
+    for component in range(component_count):
+
+        closure = 0
+
+        for node_id in component_nodes[component]:
+            if node_id in node_bits:
+                closure |= 1 << node_bits[node_id]
+
+        for dependency in component_dependencies[component]:
+
+            closure |= closures[dependency]
+            referencer_counts[dependency] -= 1
+
+            if referencer_counts[dependency] == 0:
+                closures[dependency] = 0
+
+        if component in target_components:
+            yield component, closure
+
+        if referencer_counts[component] > 0:
+            closures[component] = closure
+
+
+def get_closure_sizes(graph, node_sizes, target_nodes, edge_mask = hard_edge):
+
+    #returns node id -> (node count, total size) of the target nodes and everything they depend on through edge_mask edges.
+    #only nodes in node_sizes are counted.
+    bit_nodes = sorted(node_sizes.keys())
+    node_bits = {node_id:i for i, node_id in enumerate(bit_nodes)}
+    bit_sizes = [node_sizes[node_id] for node_id in bit_nodes]
+
+    components, component_count = get_strongly_connected_components(graph, edge_mask)
+    component_sizes = {}
+
+    for component, closure in get_component_closures(graph, components, component_count, node_bits, target_nodes, edge_mask):
+        closure_bits = get_set_bits(closure)
+        component_sizes[component] = (len(closure_bits), sum([bit_sizes[x] for x in closure_bits]))
+
+    return {x:component_sizes[components[x]] for x in target_nodes}
+
+
+def get_reachable_nodes(graph, source_nodes, target_nodes, edge_mask = hard_edge | soft_edge):
+
+    #returns node id -> set of target node ids that each source node depends on, directly or through other nodes.
+    #source nodes that can't reach any target node are left out.
+    bit_nodes = sorted(set(target_nodes))
+    node_bits = {node_id:i for i, node_id in enumerate(bit_nodes)}
+
+    components, component_count = get_strongly_connected_components(graph, edge_mask)
+    component_closures = {}
+
+    for component, closure in get_component_closures(graph, components, component_count, node_bits, source_nodes, edge_mask):
+        if closure:
+            component_closures[component] = closure
+
+    reachable_nodes = {}
+
+    for node_id in source_nodes:
+
+        closure = component_closures.get(components[node_id], 0)
+
+        #like get_connected_nodes, a node is never reported as its own dependency.
+        if node_id in node_bits:
+            closure &= ~(1 << node_bits[node_id])
+
+        reachable = set([bit_nodes[x] for x in get_set_bits(closure)])
+
+        if len(reachable):
+            reachable_nodes[node_id] = reachable
+
+    return reachable_nodes
\ No newline at end of file
@@ -4,7 +4,7 @@
 
 __version__ = "1.2.0"
 
-import igby_lib, perforce_helper, ugs_lib, prerequisites_lib, sys, time, subprocess, os, importlib, traceback
+import igby_lib, perforce_helper, ugs_lib, prerequisites_lib, sys, time, subprocess, os, importlib, traceback, threading
 
 def run(settings_json_file, debug = False):
 
@@ -18,9 +18,11 @@ def run(settings_json_file, debug = False):
     "UE_PROJECT_PATH":{"type":"str", "info":"Project path. ex: D:\\Unreal Projects\\LyraStarterGame\\Lyra.uproject"},
     "UGS_EXE_PATH":{"type":"str", "optional":True, "info":"Ugs executable path. ex: C:\\Users\\user\\AppData\\Local\\UnrealGameSync\\Latest\\ugs.exe"},
     "PROJECT_CONTENT_INTEGRITY_TEST":{"type":"bool", "default":True, "info":"Test to see if project content matches files in perforce depot"},
+    "PROJECT_CONTENT_INTEGRITY_FULL_TEST_HOURS":{"type":"int", "optional":True, "default":24, "info":"Number of hours between full project content integrity tests. In between only files changed by new changelists are tested. 0 = Always run the full test."},
     "HALT_ON_ERROR":{"type":"bool", "default":True, "info":"Determines if Igby should halt execution on error."},
     "FORCE_RUN":{"type":"bool", "default":False, "info":"Determines if Igby should run even if there aren't any updates established at the beginnign of execution."},
     "SKIP_SYNC":{"type":"bool", "default":False, "info":"Determines if Igby should sync."},
+    "P4_CACHE_HANDOFF":{"type":"bool", "optional":True, "default":True, "info":"Determines if Igby should build the perforce caches while the editor is starting and hand them to the editor process."},
     "MODULE_SETTING_PRESETS":{"type":"dict", "info":"This is where you can define presets for module settings."},
     "MODULES_TO_RUN":{"type":"list(dict)", "info":"This is a dictionary of all modules and their settings"},
     "MODULE_DEFAULT_SETTINGS":{"deprecated":"Replaced by \"MODULE_SETTING_PRESETS\" in order to support multiple presets."},
@@ -71,6 +73,10 @@ def run(settings_json_file, debug = False):
 
     submitted_changelist = 0
 
+    #head changelist under the sync paths at the last completed sync and the changelist that sync reached.
+    synced_head_cl = 0
+    synced_cl = 0
+
     #start main loop
     while True:
 
@@ -120,36 +126,54 @@ def run(settings_json_file, debug = False):
         logger.log("")
 
         #test p4 connection
-        if not p4.connected() or not p4.loggedin():
-            p4.connect()
-
-        if not p4.connected() or not p4.loggedin():
+        if not p4.keepalive():
 
             logger.log("Perforce connection could not be established! Will try again during next run.", "error_clr")
             logger.log("")
             success = False
         else:
 
+            sync_up_to_date = False
+
             if not settings["SKIP_SYNC"]:
 
+                #a single changes query tells if anything was submitted under the sync paths since the last completed sync.
+                sync_check_paths = list(settings["P4_DIRS_TO_SYNC"])
+
+                if "UGS_EXE_PATH" in settings:
+                    sync_check_paths.append(os.path.dirname(ue_project_path))
+
+                head_cl = p4.get_highest_head_changelist_number(sync_check_paths)
+
+                if synced_head_cl > 0 and head_cl <= synced_head_cl:
+                    logger.log(f"No changelists newer than {synced_head_cl}. Skipping sync.")
+                    highest_cl = synced_cl
+                    sync_up_to_date = True
+
+            if not settings["SKIP_SYNC"] and not sync_up_to_date:
+
                 #Sync to latest
                 p4_dirs_to_sync = settings["P4_DIRS_TO_SYNC"]
 
                 for p4_dir_to_sync in p4_dirs_to_sync:
-
                     logger.log("\t{}".format(p4_dir_to_sync))
-                    results = p4.get_latest(p4_dir_to_sync)
 
-                    have_cl = 0
+                #all paths are synced together and the highest changelist is queried once for all of them.
+                results = p4.sync_paths(p4_dirs_to_sync)
 
-                    if results == []:                    
-                        have_cl = int(p4.get_have_changelist_number(p4_dir_to_sync))
+                if len(p4_dirs_to_sync):
+
+                    have_cl = p4.get_highest_have_changelist_number(p4_dirs_to_sync)
+
+                    if results == []:
                         logger.log(f"\t\tAlready have latest changelist {have_cl}")
                     else:
-                        have_cl = int(results[0]["change"])
+                        sync_totals = [result for result in results if type(result) is dict and "totalFileCount" in result]
+                        file_count = sum([int(result["totalFileCount"]) for result in sync_totals])
+                        file_size = sum([int(result["totalFileSize"]) for result in sync_totals])
                         changes = True
                         logger.log("\t\tSynced")
-                        logger.log("\t\tHead CL: {} File Count: {} Total Size: {}".format(have_cl, results[0]["totalFileCount"], results[0]["totalFileSize"]))
+                        logger.log("\t\tHead CL: {} File Count: {} Total Size: {}".format(have_cl, file_count, file_size))
 
                         if have_cl > highest_cl:
                             highest_cl = have_cl
@@ -180,6 +204,13 @@ def run(settings_json_file, debug = False):
                     if ugs_cl > highest_cl:
                         highest_cl = ugs_cl
 
+                synced_head_cl = head_cl
+                synced_cl = highest_cl
+
+                #keep syncing every run while ugs holds back the latest changelist of the project.
+                if "UGS_EXE_PATH" in settings and ugs_cl < p4.get_highest_head_changelist_number([os.path.dirname(ue_project_path)]):
+                    synced_head_cl = 0
+
             #Only run if there were changes to sync or pre run
             if changes or pre_run_update or settings["FORCE_RUN"]:
 
@@ -188,14 +219,28 @@ def run(settings_json_file, debug = False):
                 #Check for assets that are not in perforce
                 if settings["PROJECT_CONTENT_INTEGRITY_TEST"]:
                     
-                    integrity_results = igby_lib.integrity_test(logger, p4, ue_project_path)
+                    integrity_results = igby_lib.integrity_test(logger, p4, ue_project_path, settings["PROJECT_CONTENT_INTEGRITY_FULL_TEST_HOURS"])
                     if not integrity_results:
                         return False
             
                 #launch headless UE and run command
                 settings_json_file_ds = settings_json_file.replace('\\','/')
 
-                cmd = f'"{ue_cmd_exe_path}" "{ue_project_path}" -SILENT -UNATTENDED -AllowCommandletRendering -asynctexturecompilation=off -stdout -FullStdOutLogOutput -run=pythonscript -script="import igby; igby.run_modules(\'{settings_json_file_ds}\',\'{highest_cl}\',\'{p4.password}\',{header_str_len})"'
+                #build perforce caches while the editor starts up and hand them off to the editor process.
+                cache_handoff_path = ""
+                cache_thread = None
+
+                if settings["P4_CACHE_HANDOFF"]:
+
+                    cache_handoff_path = f"{p4.cache_dir}/{p4.p4.client}_handoff.pickle".replace('\\','/')
+
+                    if os.path.isfile(cache_handoff_path):
+                        os.remove(cache_handoff_path)
+
+                    cache_thread = threading.Thread(target=build_p4_cache_handoff, args=(p4, logger, ue_project_path, cache_handoff_path))
+                    cache_thread.start()
+
+                cmd = f'"{ue_cmd_exe_path}" "{ue_project_path}" -SILENT -UNATTENDED -AllowCommandletRendering -asynctexturecompilation=off -stdout -FullStdOutLogOutput -run=pythonscript -script="import igby; igby.run_modules(\'{settings_json_file_ds}\',\'{highest_cl}\',\'{p4.password}\',{header_str_len},\'{cache_handoff_path}\')"'
 
                 run_modules_start = False
                 run_modules_end = False
@@ -289,6 +334,9 @@ def run(settings_json_file, debug = False):
                         logger.log("Trying again.")
                         success = False
 
+                if cache_thread:
+                    cache_thread.join()
+
                 elapsed_update_time = int(time.time()) - post_sync_start_time
                 average_update_run_time = (average_update_run_time * update_run_count + elapsed_update_time) / (update_run_count+1)
                 update_run_count+=1
@@ -319,14 +367,14 @@ def run(settings_json_file, debug = False):
 
         
 
-def run_modules(settings_json_file, synced_cl, p4_password, header_str_len):
+def run_modules(settings_json_file, synced_cl, p4_password, header_str_len, cache_handoff_path = ""):
 
     print("<igby_info>_run_modules_start")
     success = True
 
     try:
 
-        import unreal, igby_lib, inspect
+        import unreal, igby_lib, inspect, ue_asset_lib
 
         settings = igby_lib.get_settings(settings_json_file)
 
@@ -340,13 +388,19 @@ def run_modules(settings_json_file, synced_cl, p4_password, header_str_len):
             return success
         
         ue_project_path = settings["UE_PROJECT_PATH"]
-        filelog_paths = list()
-        filelog_paths.append(f"{os.path.dirname(ue_project_path)}\\Content")
-        p4.build_filelog_cache(filelog_paths)
-        p4.build_changelist_cache()
+
+        #use the caches built by the igby process when available.
+        if cache_handoff_path == "" or not p4.load_cache_handoff(cache_handoff_path):
+            build_p4_caches(p4, ue_project_path)
 
         modules_to_run = settings["MODULES_TO_RUN"]
 
+        dependency_graph_settings = igby_lib.validate_settings(settings, ue_asset_lib.dependency_graph_settings_definition, logger)
+        ue_asset_lib.dependency_graph_verify_samples = dependency_graph_settings["UE_DEPENDENCY_GRAPH_VERIFY_SAMPLES"]
+        ue_asset_lib.dependency_graph_full_rebuild_hours = dependency_graph_settings["UE_DEPENDENCY_GRAPH_FULL_REBUILD_HOURS"]
+        ue_asset_lib.dependency_graph_changelist = int(synced_cl)
+        ue_asset_lib.dependency_graph_p4 = p4
+
         #wait for assets to be loaded for ue4
         asset_registry = unreal.AssetRegistryHelpers.get_asset_registry()
         
@@ -402,6 +456,12 @@ def run_modules(settings_json_file, synced_cl, p4_password, header_str_len):
                 module = importlib.import_module(module_name)
                 module_run = getattr(module, 'run')
 
+                #modules that modify assets need live dependency queries because the snapshot doesn't follow their changes.
+                ue_asset_lib.dependency_graph_enabled = dependency_graph_settings["UE_DEPENDENCY_GRAPH"] and not module_name.endswith("_S")
+
+                #the same goes for the package file index, which is checked against the disk while they run.
+                ue_asset_lib.package_file_index_trusted = not module_name.endswith("_S")
+
                 arg_spec = inspect.getargspec(module_run)
 
                 logger.prefix = "    "
@@ -423,6 +483,11 @@ def run_modules(settings_json_file, synced_cl, p4_password, header_str_len):
                 if handle_error(settings):
                     success = False
 
+            #modules ending with _S save and delete packages, so the package caches have to be rebuilt. This includes
+            #modules that failed part way through.
+            if module_name.endswith("_S"):
+                ue_asset_lib.invalidate_package_caches()
+
             elapsed_time = int(time.time()) - module_start_time
 
             if module_success:
@@ -441,6 +506,35 @@ def run_modules(settings_json_file, synced_cl, p4_password, header_str_len):
     return success
 
 
+def build_p4_caches(p4, ue_project_path):
+
+    filelog_paths = list()
+    filelog_paths.append(f"{os.path.dirname(ue_project_path)}\\Content")
+
+    #the shared cache service keeps the caches for every igby instance on the machine.
+    if p4.load_cache_service(filelog_paths[0]):
+        return
+
+    p4.build_filelog_cache(filelog_paths)
+    p4.build_changelist_cache(filelog_paths[0])
+
+
+def build_p4_cache_handoff(p4, logger, ue_project_path, cache_handoff_path):
+
+    try:
+
+        p4.clear_caches()
+        build_p4_caches(p4, ue_project_path)
+        p4.save_cache_handoff(cache_handoff_path)
+
+    except Exception:
+
+        #let the editor process know that it has to build the caches itself.
+        logger.log("Error! Perforce caches could not be built for the editor process.", "error_clr")
+        logger.log(traceback.format_exc(), "error_clr")
+        p4.save_cache_handoff(cache_handoff_path, True)
+
+
 def handle_error(settings):
 
     logger = igby_lib.logger()
@@ -2,7 +2,7 @@
 # Developed by Richard Greenspan | rg.igby@gmail.com
 # Licensed under the MIT license. See LICENSE file in the project root for details.
 
-import os, json, hashlib
+import os, json, hashlib, pickle, time, threading, concurrent.futures
 from datetime import datetime
 from inspect import stack
 
@@ -506,23 +506,59 @@ def get_lib_dir():
     return script_dir
 
 
-def integrity_test(logger, p4, ue_project_path):
+def integrity_test(logger, p4, ue_project_path, full_test_hours = 0):
 
     test_fail = False
 
     logger.log("Testing project content integrity.\n")
     project_integrity_report = ""
     abs_content_path = f"{os.path.dirname(ue_project_path)}\\Content"
-    p4_have_content_files = p4.get_have_files_in_folder(abs_content_path)
-    p4_have_content_files = set([x.lower() for x in p4_have_content_files])
 
-    local_content_files = set()
+    #the have list and local files verified by the previous test are kept so that only files changed since then need to be checked.
+    cache_path = p4.get_cache_path("integrity", abs_content_path)
+    cache = p4.load_path_cache(cache_path, abs_content_path)
+    have_cl = p4.get_highest_have_changelist_number([abs_content_path])
 
-    for r, d, f in os.walk(abs_content_path):
-        r = r.replace("\\","/").lower()
-        for file in f:
-            file = file.lower()
-            local_content_files.add(f"{r}/{file}")
+    full_test = cache == None or have_cl < cache["change"] or time.time() - cache["full_test_time"] >= full_test_hours * 3600
+
+    if full_test:
+
+        logger.log("Running full integrity test.")
+        cache = p4.new_path_cache(abs_content_path)
+        cache["full_test_time"] = time.time()
+        cache["have"] = p4.get_have_file_map([f"{abs_content_path}/...".replace("\\","/")])
+        cache["local"] = set()
+
+        for file_path, size, mtime in get_content_manifest(abs_content_path).get_files():
+            cache["local"].add(file_path.replace("\\","/").lower())
+
+    elif have_cl > cache["change"]:
+
+        changed_depot_files = p4.get_changed_depot_files(abs_content_path, cache["change"] + 1, have_cl)
+        logger.log(f"Running incremental integrity test for {len(changed_depot_files)} files changed since changelist {cache['change']}.")
+
+        changed_local_files = set()
+
+        for depot_file in changed_depot_files:
+            if depot_file.lower() in cache["have"]:
+                changed_local_files.add(cache["have"].pop(depot_file.lower()))
+
+        changed_have_files = p4.get_have_file_map(changed_depot_files)
+        cache["have"].update(changed_have_files)
+        changed_local_files.update(changed_have_files.values())
+
+        for local_file in changed_local_files:
+            if os.path.isfile(local_file):
+                cache["local"].add(local_file.lower())
+            else:
+                cache["local"].discard(local_file.lower())
+
+    else:
+
+        logger.log(f"Integrity test is up to date with changelist {have_cl}.")
+
+    p4_have_content_files = set([x.lower() for x in cache["have"].values()])
+    local_content_files = cache["local"]
 
     local_files_not_in_depot = list(local_content_files - p4_have_content_files)
 
@@ -545,6 +581,11 @@ def integrity_test(logger, p4, ue_project_path):
         logger.log("Halting igby run due to project content inconsistencies.\nDetailed information can be found in in this report: {}".format(error_log_path), "error_clr")
         return False
     else:
+        #only a verified state is used as the base of the next incremental test.
+        if full_test or have_cl != cache["change"]:
+            cache["change"] = have_cl
+            save_cache(cache_path, cache)
+
         logger.log("Project content integrity confirmed.")
         return True
     
@@ -554,13 +595,235 @@ def get_file_disk_size(file_path, unit = "b"):
     
     if os.path.isfile(file_path):
         
-        disk_size = os.path.getsize(file_path)
+        disk_size = convert_disk_size(os.path.getsize(file_path), unit)
+
+    return disk_size
+
+
+def convert_disk_size(disk_size, unit = "b"):
+
+    if unit == "kb":
+        disk_size /= 1024.0
+    elif unit == "mb":
+        disk_size /= 1048576.0
+    elif unit == "gb":
+        disk_size /= 1073741824.0
+
+    return disk_size
+
+
+def get_igby_dir():
+
+    igby_dir = os.path.dirname(get_current_script_dir())
+    return igby_dir
+
+
+def save_cache(cache_path, data):
+
+    #create directory path if it doesn't exist
+    dir_path = os.path.dirname(cache_path)
+    if not os.path.isdir(dir_path):
+        os.makedirs(dir_path)
+
+    #write to a temp file first so that an interrupted run can't leave a partial cache behind.
+    temp_path = f"{cache_path}.tmp"
+
+    with open(temp_path, "wb") as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+    os.replace(temp_path, cache_path)
+
+
+def load_cache(cache_path):
+
+    data = None
+
+    if os.path.isfile(cache_path):
+
+        try:
+            with open(cache_path, "rb") as f:
+                data = pickle.load(f)
+        except:
+            data = None
+
+    return data
+
+
+def walk_dirs(root_dir, scan_function, max_workers = 8):
+
+    #calls scan_function(dir) for the root and every subdirectory it returns. Directories are scanned in parallel,
+    #which hides the per directory latency of network and cold storage.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        pending = {executor.submit(scan_function, root_dir)}
+
+        while len(pending):
+
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                for subdir in future.result():
+                    pending.add(executor.submit(scan_function, subdir))
+
+
+def scan_dir(dir_path):
+
+    #returns the subdirectory names and (file name, size, mtime) of the files in a directory. On windows the stat data comes with the listing.
+    subdirs = []
+    files = []
+
+    with os.scandir(dir_path) as entries:
+
+        for entry in entries:
+
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif entry.is_file():
+                stat = entry.stat()
+                files.append((entry.name, stat.st_size, stat.st_mtime))
+
+    return subdirs, files
+
+
+def get_content_manifest(content_path):
+
+    #one manifest per content path and process. It is brought up to date on every use, since syncs and
+    #modules change content between uses. Only directories with a changed mtime are listed again.
+    content_path = os.path.normpath(content_path)
+    manifest_key = content_path.lower()
+
+    if manifest_key not in content_manifests:
+        content_manifests[manifest_key] = content_manifest(content_path)
+
+    manifest = content_manifests[manifest_key]
+    manifest.update()
+
+    return manifest
+
+
+content_manifests = {}
+
+
+#persistent manifest of the files in a content folder. Directories are only listed again when their mtime changed,
+#which happens when files are added, removed or replaced by perforce or the editor saving packages.
+class content_manifest:
+
+    #increment when the layout of the saved manifest changes.
+    manifest_version = 1
+
+    def __init__(self, content_path, cache_dir = ""):
+
+        self.content_path = os.path.normpath(content_path)
+
+        if cache_dir == "":
+            cache_dir = f"{get_igby_dir()}/Cache"
+
+        key_hash = hashlib.md5(self.content_path.lower().encode()).hexdigest()[0:16]
+        self.cache_path = f"{cache_dir}/content_manifest_{key_hash}.pickle"
+
+        #relative lowercase dir path -> [relative dir path, dir mtime, lowercase subdir names, {lowercase file name: (file name, size, mtime)}]
+        self.dirs = {}
+
+        manifest = load_cache(self.cache_path)
+
+        if type(manifest) is dict and manifest.get("version") == self.manifest_version and manifest.get("path") == self.content_path.lower():
+            self.dirs = manifest["dirs"]
+
+    def update(self):
+
+        dirs = {}
+        rescanned_dirs = []
+        dirs_lock = threading.Lock()
+
+        #every directory is stat'ed, but only directories with a new mtime are listed again.
+        def update_dir(rel_dir):
+
+            dir_path = self.get_system_path(rel_dir)
+
+            try:
+                dir_mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                return []
+
+            dir_entry = self.dirs.get(rel_dir.lower())
+
+            if dir_entry == None or dir_entry[1] != dir_mtime:
+
+                try:
+                    subdirs, files = scan_dir(dir_path)
+                except OSError:
+                    return []
+
+                dir_entry = [rel_dir, dir_mtime, subdirs, {name.lower():(name, size, mtime) for name, size, mtime in files}]
+                rescanned_dirs.append(rel_dir)
+
+            with dirs_lock:
+                dirs[rel_dir.lower()] = dir_entry
+
+            return [f"{rel_dir}/{subdir}" if rel_dir else subdir for subdir in dir_entry[2]]
+
+        walk_dirs("", update_dir)
+
+        self.dirs = dirs
+
+        if len(rescanned_dirs):
+            save_cache(self.cache_path, {"version":self.manifest_version, "path":self.content_path.lower(), "dirs":self.dirs})
+
+        return len(rescanned_dirs)
+
+    def get_system_path(self, rel_path):
+
+        if rel_path == "":
+            return self.content_path
+
+        return os.path.join(self.content_path, *rel_path.split("/"))
+
+    def get_rel_path(self, system_path):
+
+        rel_path = os.path.relpath(os.path.normpath(system_path), self.content_path).replace("\\", "/")
+
+        if rel_path == ".":
+            rel_path = ""
+
+        return rel_path
+
+    def get_file(self, system_path):
+
+        #returns (system path, size, mtime) or None if the file is not in the manifest.
+        rel_dir, file_name = os.path.split(self.get_rel_path(system_path))
+        dir_entry = self.dirs.get(rel_dir.lower())
+
+        if dir_entry == None or file_name.lower() not in dir_entry[3]:
+            return None
+
+        name, size, mtime = dir_entry[3][file_name.lower()]
+
+        return (self.get_system_path(f"{dir_entry[0]}/{name}" if dir_entry[0] else name), size, mtime)
+
+    def get_dirs(self, dir_path = ""):
+
+        #system paths of the directory and all of its subdirectories.
+        rel_dir_l = self.get_rel_path(dir_path).lower() if dir_path else ""
+        dirs = []
+
+        for dir_key, dir_entry in self.dirs.items():
+
+            if rel_dir_l == "" or dir_key == rel_dir_l or dir_key.startswith(f"{rel_dir_l}/"):
+                dirs.append(self.get_system_path(dir_entry[0]))
+
+        return dirs
+
+    def get_files(self, dir_path = ""):
+
+        #(system path, size, mtime) of all files in the directory and its subdirectories.
+        rel_dir_l = self.get_rel_path(dir_path).lower() if dir_path else ""
+        files = []
+
+        for dir_key, dir_entry in self.dirs.items():
+
+            if rel_dir_l == "" or dir_key == rel_dir_l or dir_key.startswith(f"{rel_dir_l}/"):
 
-        if unit == "kb":
-            disk_size /= 1024.0
-        elif unit == "mb":
-            disk_size /= 1048576.0
-        elif unit == "gb":
-            disk_size /= 1073741824.0
+                for name, size, mtime in dir_entry[3].values():
+                    files.append((self.get_system_path(f"{dir_entry[0]}/{name}" if dir_entry[0] else name), size, mtime))
 
-    return disk_size
\ No newline at end of file
+        return files
\ No newline at end of file
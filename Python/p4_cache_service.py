@@ -0,0 +1,148 @@
+# p4_cache_service.py for Igby UE Project Automator
+# Developed by Richard Greenspan | rg.igby@gmail.com
+# Licensed under the MIT license. See LICENSE file in the project root for details.
+
+# The cache service owns the perforce metadata caches for a client and serves them to every Igby instance on the machine.
+# Instances connect to it when P4_CACHE_SERVICE_PORT is set. The caches are refreshed incrementally once per new changelist.
+# Run with: python p4_cache_service.py settings.json
+
+import igby_lib, perforce_helper, sys, os, time, threading, traceback
+from multiprocessing.connection import Listener
+
+class p4_cache_service:
+
+    service_settings_definition = {
+    "LOG_PATH":{"type":"str", "info":"Path where igby will save the log. The resulting path will be modified to include a timestamp in the filename."},
+    "P4_CACHE_SERVICE_POLL_SEC":{"type":"int", "optional":True, "default":30, "info":"Number of seconds the cache service waits between checks for new changelists."}
+    }
+
+    def __init__(self, settings, logger):
+
+        self.service_settings_definition.update(perforce_helper.p4_helper.p4_settings_defenition)
+        validated_settings = igby_lib.validate_settings(settings, self.service_settings_definition, logger)
+
+        self.logger = logger
+        self.poll_sec = max(validated_settings["P4_CACHE_SERVICE_POLL_SEC"], 1)
+        self.p4 = perforce_helper.p4_helper(validated_settings, logger)
+        self.port = self.p4.cache_service_port
+
+        if self.port == 0:
+            raise Exception("P4_CACHE_SERVICE_PORT has to be set to run the perforce cache service.")
+
+        #caches per content path. Each entry is replaced as a whole when it is refreshed so that it can be served without locking.
+        self.path_caches = {}
+        self.p4_lock = threading.Lock()
+
+
+    def run(self):
+
+        refresh_thread = threading.Thread(target=self.refresh_loop, daemon=True)
+        refresh_thread.start()
+
+        self.logger.log(f"Perforce cache service listening on localhost:{self.port}")
+
+        with Listener(("localhost", self.port), authkey=self.p4.get_cache_service_authkey()) as listener:
+
+            while True:
+
+                try:
+                    connection = listener.accept()
+                except Exception:
+                    self.logger.log("Cache service connection was refused.", "warning_clr")
+                    continue
+
+                threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+
+
+    def handle_connection(self, connection):
+
+        with connection:
+
+            try:
+
+                request = connection.recv()
+
+                if request["request"] == "caches":
+                    response = self.get_path_cache(request["path"])
+                else:
+                    response = {"error":f"Unknown request: {request['request']}"}
+
+            except Exception:
+
+                self.logger.log(traceback.format_exc(), "error_clr")
+                response = {"error":"Cache service failed to handle the request."}
+
+            try:
+                connection.send(response)
+            except Exception:
+                self.logger.log("Cache service response could not be sent.", "warning_clr")
+
+
+    def get_path_cache(self, path):
+
+        #paths requested for the first time are built right away and refreshed from then on.
+        if path not in self.path_caches:
+
+            with self.p4_lock:
+
+                if path not in self.path_caches:
+                    self.refresh_path_cache(path)
+
+        return self.path_caches[path]
+
+
+    def refresh_loop(self):
+
+        while True:
+
+            time.sleep(self.poll_sec)
+
+            try:
+
+                with self.p4_lock:
+
+                    self.p4.keepalive()
+
+                    for path, path_cache in list(self.path_caches.items()):
+
+                        #only refresh when a new changelist was submitted under the path.
+                        head_change = self.p4.get_head_changelist_number(f"{path}/...".replace("\\","/"))
+
+                        if head_change != path_cache["change"]:
+                            self.refresh_path_cache(path)
+
+            except Exception:
+
+                self.logger.log(traceback.format_exc(), "error_clr")
+
+
+    def refresh_path_cache(self, path):
+
+        self.logger.log(f"Refreshing perforce caches for: {path}")
+
+        #get the head changelist first so that changelists submitted during the refresh trigger another refresh.
+        head_change = self.p4.get_head_changelist_number(f"{path}/...".replace("\\","/"))
+
+        #the build functions update the on disk caches incrementally and load them into fresh objects.
+        self.p4.clear_caches()
+        self.p4.build_filelog_cache([path])
+        self.p4.build_changelist_cache(path)
+
+        path_cache = self.p4.new_path_cache(path)
+        path_cache["change"] = head_change
+        path_cache["filelog"] = self.p4.filelog
+        path_cache["depot_changes"] = self.p4.depot_changes
+
+        self.path_caches[path] = path_cache
+
+
+if __name__ == "__main__":
+
+    settings_json_file = sys.argv[1]
+    settings = igby_lib.get_settings(settings_json_file)
+
+    logger = igby_lib.logger(settings["LOG_PATH"])
+    os.system('title Igby Perforce Cache Service')
+
+    service = p4_cache_service(settings, logger)
+    service.run()
\ No newline at end of file
@@ -2,7 +2,8 @@
 # Developed by Richard Greenspan | rg.igby@gmail.com
 # Licensed under the MIT license. See LICENSE file in the project root for details.
 
-import sys, os, getpass, igby_lib, datetime
+import sys, os, getpass, igby_lib, datetime, hashlib, array, threading, queue, concurrent.futures, time, secrets
+from multiprocessing.connection import Client, AuthenticationError
 
 #Add Perforce lib to path
 current_script_dir = igby_lib.get_current_script_dir()
@@ -27,7 +28,7 @@ if not perforce_version_supported:
 if os.path.isdir(perforce_script_dir):
     sys.path.append(perforce_script_dir)
 
-from P4 import P4, P4Exception
+from P4 import P4, P4Exception, DepotFile, OutputHandler
 
 class p4_helper:
 
@@ -37,21 +38,47 @@ class p4_helper:
     "P4_CLIENT":{"type":"str", "info":"Perforce client spec name."},
     "P4_CHARSET":{"type":"str", "default":"utf8", "info":"Character encoding spec."},
     "P4_PASSWORD":{"deprecated":"To improve security the perforce password must be entered manually."},
-    "P4_CL_DESCRIPTION_PREFIX":{"type":"str", "default":"#igby_automation", "info":"Perforce changelist description prefix. ex: #igby_automation"}
+    "P4_CL_DESCRIPTION_PREFIX":{"type":"str", "default":"#igby_automation", "info":"Perforce changelist description prefix. ex: #igby_automation"},
+    "P4_CACHE_DIR":{"type":"str", "optional":True, "default":"", "info":"Directory where perforce metadata caches are saved between runs. Defaults to the Cache folder in the Igby directory."},
+    "P4_OWNER_IGNORE_USERS":{"type":"list(str)", "optional":True, "default":[], "info":"Users that are ignored when determining the best user of a file. ex: build machine users."},
+    "P4_OWNER_IGNORE_HASHTAGS":{"type":"list(str)", "optional":True, "default":[], "info":"Changelists with a description containing one of these hashtags are ignored when determining the best user of a file. ex: #igby_automation"},
+    "P4_OWNER_IGNORE_CHANGELISTS":{"type":"list(int)", "optional":True, "default":[], "info":"Changelists that are ignored when determining the best user of a file."},
+    "P4_PARALLEL_CONNECTIONS":{"type":"int", "optional":True, "default":4, "info":"Number of perforce connections used to build the filelog and changelist caches in parallel. 1 = No parallelism."},
+    "P4_CACHE_SERVICE_PORT":{"type":"int", "optional":True, "default":0, "info":"Localhost port of the shared perforce cache service (p4_cache_service.py). 0 = Caches are built by this igby instance."}
     }
 
+    #increment when the layout or content of the saved caches changes so that old caches get rebuilt.
+    cache_version = 5
+
+    #max number of paths sent to the server in a single command.
+    batch_size = 1000
+
+    #number of seconds before the cached ticket expiration when the login state is checked with the server again.
+    login_refresh_sec = 600
+
     def __init__(self, settings, logger, p4_password=""):
 
         validated_settings = igby_lib.validate_settings(settings, self.p4_settings_defenition, logger)
 
-        self.p4 = P4()
+        self.p4 = p4_connection()
         self.logger = logger
+        self.ticket_expiration_time = 0
+        self.p4.auth_error_callback = self.expire_login
 
         self.p4.port = validated_settings["P4_PORT"]
         self.p4.user = validated_settings["P4_USER"]
         self.p4.client = validated_settings["P4_CLIENT"]
         self.p4.charset = validated_settings["P4_CHARSET"]
         self.cl_descsription_prefix = validated_settings["P4_CL_DESCRIPTION_PREFIX"]
+        self.cache_dir = validated_settings["P4_CACHE_DIR"]
+        self.parallel_connections = max(validated_settings["P4_PARALLEL_CONNECTIONS"], 1)
+        self.cache_service_port = validated_settings["P4_CACHE_SERVICE_PORT"]
+        self.owner_ignore_users = set(validated_settings["P4_OWNER_IGNORE_USERS"])
+        self.owner_ignore_hashtags = [x.lower() for x in validated_settings["P4_OWNER_IGNORE_HASHTAGS"]]
+        self.owner_ignore_changelists = set([int(x) for x in validated_settings["P4_OWNER_IGNORE_CHANGELISTS"]])
+
+        if self.cache_dir == "":
+            self.cache_dir = f"{igby_lib.get_igby_dir()}/Cache"
 
         self.password = p4_password
         if self.password == "":
@@ -66,9 +93,16 @@ class p4_helper:
         self.depot_root_l = f"{self.depot_root.lower()}/"
 
         #for caching p4 info
-        self.depot_filelog = {}
-        self.changelist_files = {}
+        self.filelog = filelog_store()
+        self.depot_paths = {}
         self.depot_changes = {}
+        self.change_descriptions = {}
+        self.ignored_changes = {}
+        self.file_status = {}
+        self.file_ownership = None
+        self.change_weights = {}
+        self.connection_pool = None
+        self.parallel_sync_supported = True
 
     #general functions
     def connect(self):
@@ -116,7 +150,12 @@ class p4_helper:
     
     def loggedin(self):
 
+        #the cached ticket expiration is trusted until it gets close or a command fails with an authentication error.
+        if time.time() < self.ticket_expiration_time - self.login_refresh_sec:
+            return True
+
         logged_in = False
+        self.ticket_expiration_time = 0
 
         try:
             login_info = self.p4.run_login("-s")
@@ -124,72 +163,414 @@ class p4_helper:
 
             if ticket_expiration > 0:
                 logged_in = True
+                self.ticket_expiration_time = time.time() + ticket_expiration
         except:
             pass
 
         return logged_in
 
 
+    def expire_login(self):
+
+        self.ticket_expiration_time = 0
+
+
+    def keepalive(self):
+
+        #only talks to the server when the connection dropped or the cached ticket is about to expire.
+        if self.connected() and self.loggedin():
+            return True
+
+        return self.connect()
+
+
     #file functions
 
     def build_filelog_cache(self, paths = [None]):
 
-        filelogs = list()
-
         for path in paths:
 
-            path = path.replace("\\","/")
-
             if not path:
                 path = f"{self.client_root}/..."
             else:
-                path = f"{path}/..."
+                path = f"{path}/...".replace("\\","/")
 
             self.logger.log(f"Building filelog cache for: {path}")
 
-            filelogs = self.p4.run_filelog(path)
+            head_change = self.get_head_changelist_number(path)
+            cache_path = self.get_cache_path("filelog", path)
+            cache = self.load_path_cache(cache_path, path)
 
-            progress_bar = igby_lib.long_process(len(filelogs), self.logger)
+            if cache != None and cache["change"] == head_change:
 
-            for filelog in filelogs:
-                depot_file_l = filelog.depotFile.lower()
-                self.depot_filelog[depot_file_l] = [filelog]
+                self.logger.log(f"Filelog cache is up to date with changelist {head_change}.")
 
-                for rev in filelog.revisions:
+            elif cache != None and cache["change"] < head_change:
 
-                    if rev.change in self.changelist_files:
-                        self.changelist_files[rev.change].append(depot_file_l)
-                    else:
-                        self.changelist_files[rev.change] = [depot_file_l]
+                self.logger.log(f"Updating filelog cache from changelist {cache['change']} to {head_change}.")
+                self.fetch_filelogs_to_cache(path, cache["filelog"], cache["change"], f"@{cache['change'] + 1},@{head_change}")
+                cache["change"] = head_change
+                igby_lib.save_cache(cache_path, cache)
 
-                progress_bar.make_progress()
+            else:
+
+                self.logger.log("Filelog cache is missing or outdated. Rebuilding.")
+                cache = self.new_path_cache(path)
+                cache["filelog"] = filelog_store()
+                if head_change > 0:
+                    self.fetch_filelogs_to_cache(path, cache["filelog"])
+                cache["change"] = head_change
+                igby_lib.save_cache(cache_path, cache)
+
+            #merge path cache into the run cache.
+            if self.filelog.file_count() == 0:
+                self.filelog = cache["filelog"]
+            else:
+                self.filelog.merge(cache["filelog"])
 
-            file_log_count = len(filelogs)
-            self.file_info_cached = file_log_count > 0
+            file_log_count = cache["filelog"].file_count()
+            self.file_info_cached = self.filelog.file_count() > 0
+
+            #ownership table is rebuilt on demand from the updated filelog cache.
+            self.file_ownership = None
+            self.change_weights = {}
             self.logger.log(f"Cached {file_log_count} files")
 
+
+    def fetch_filelogs_to_cache(self, path, store, from_change = 0, revision_range = ""):
+
+        #filelog records are added to the store as they arrive instead of collecting the whole result first.
+        handler_lock = threading.Lock()
+        handler = filelog_cache_handler(store, from_change, self.logger, handler_lock)
+
+        #each shard is fetched over its own connection. The store is shared and guarded by the handler lock.
+        def fetch_shard(p4, shard):
+
+            with p4.using_handler(handler), p4.at_exception_level(P4.RAISE_ERROR):
+                p4.run("filelog", f"{shard}{revision_range}")
+
+        self.run_parallel(fetch_shard, self.get_path_shards(path))
+
+        handler.log_progress()
+        self.logger.log("\r", "normal_clr", True, False)
+
+
+    def get_path_shards(self, path):
+
+        #split a path/... query into one query per subdirectory plus one for the files directly in the directory.
+        shards = [path]
+
+        if self.parallel_connections > 1 and path.endswith("/..."):
+
+            base_path = path[0:-4]
+
+            #-D includes directories that only contain deleted files, so that their history isn't dropped.
+            try:
+                dirs = self.p4.run("dirs", "-D", f"{base_path}/*")
+                shards = [f"{x['dir']}/..." for x in dirs if type(x) is dict and 'dir' in x]
+                shards.append(f"{base_path}/*")
+            except P4Exception:
+                shards = [path]
+
+        return shards
+
+
+    def get_connection_pool(self):
+
+        if self.connection_pool == None:
+
+            self.connection_pool = [self.p4]
+
+            for i in range(self.parallel_connections - 1):
+
+                p4 = p4_connection()
+                p4.auth_error_callback = self.expire_login
+                p4.port = self.p4.port
+                p4.user = self.p4.user
+                p4.client = self.p4.client
+                p4.charset = self.p4.charset
+                p4.password = self.password
+
+                try:
+                    p4.connect()
+
+                    #connections share the ticket of the main connection. Login only if the ticket is not available.
+                    try:
+                        p4.run_login("-s")
+                    except P4Exception:
+                        p4.run_login()
+
+                    self.connection_pool.append(p4)
+
+                except P4Exception:
+                    self.logger.log("Could not open an additional perforce connection. Continuing with fewer connections.", "warning_clr")
+                    break
+
+        return self.connection_pool
+
+
+    def run_parallel(self, function, items):
+
+        #runs function(p4, item) for every item, each call using a connection from the pool that isn't busy.
+        connection_pool = self.get_connection_pool() if len(items) > 1 else [self.p4]
+        connections = queue.Queue()
+
+        for p4 in connection_pool:
+            connections.put(p4)
+
+        def run_item(item):
+
+            p4 = connections.get()
+
+            try:
+                return function(p4, item)
+            finally:
+                connections.put(p4)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(connection_pool)) as executor:
+            results = list(executor.map(run_item, items))
+
+        return results
+
+
+    def new_path_cache(self, path):
+
+        cache = {"version":self.cache_version, "port":self.p4.port, "client":self.p4.client, "path":path, "change":0}
+
+        return cache
+
+
+    def load_path_cache(self, cache_path, path):
+
+        cache = igby_lib.load_cache(cache_path)
+
+        #discard caches that were saved by a different igby version or for a different server, client or path.
+        if cache != None:
+
+            if type(cache) is not dict or cache.get("version") != self.cache_version or cache.get("port") != self.p4.port or cache.get("client") != self.p4.client or cache.get("path") != path:
+                cache = None
+
+        return cache
+
+
+    def get_cache_path(self, cache_type, key):
+
+        key_hash = hashlib.md5(f"{self.p4.port}|{self.p4.client}|{key.lower()}".encode()).hexdigest()[0:16]
+        cache_path = f"{self.cache_dir}/{self.p4.client}_{cache_type}_{key_hash}.pickle"
+
+        return cache_path
+
+
+    def get_head_changelist_number(self, path):
+
+        head_changelist_number = 0
+
+        result = self.p4.run_changes("-m1", "-s", "submitted", path)
+
+        if len(result):
+            head_changelist_number = int(result[0]["change"])
+
+        return head_changelist_number
+
     
     def build_changelist_cache(self, path = None):
 
+        #limit the cache to the client view unless a path is provided.
         if not path:
-            path = f"{self.client_root}/..."
+            changes_path = f"//{self.p4.client}/..."
         else:
-            path = f"{path}/..."
+            changes_path = f"{path}/...".replace("\\","/")
 
-        self.logger.log("Building changelist cache.")
+        self.logger.log(f"Building changelist cache for: {changes_path}")
 
-        changes = self.p4.run_changes("-l", "-s", "submitted")
+        head_change = self.get_head_changelist_number(changes_path)
+        cache_path = self.get_cache_path("changes", changes_path)
+        cache = self.load_path_cache(cache_path, changes_path)
 
-        progress_bar = igby_lib.long_process(len(changes), self.logger)
+        if cache == None or cache["change"] > head_change:
+            cache = self.new_path_cache(changes_path)
+            cache["depot_changes"] = {}
 
-        for change in changes:
-            self.depot_changes[change["change"]] = change
-            progress_bar.make_progress()
+        if cache["change"] < head_change:
+
+            #only ask the server for changes that were submitted since the last run. Long descriptions are loaded on demand.
+            revision_range = f"@{cache['change'] + 1},@{head_change}"
+            shard_changes = self.run_parallel(lambda p4, shard: p4.run_changes("-s", "submitted", f"{shard}{revision_range}"), self.get_path_shards(changes_path))
+
+            #a change that touches several shards is reported once per shard.
+            changes = list({change["change"]:change for shard in shard_changes for change in shard}.values())
+
+            progress_bar = igby_lib.long_process(len(changes), self.logger)
+
+            for change in changes:
+                change_number = int(change["change"])
+                file_count = self.filelog.get_change_file_count(change_number)
+                cache["depot_changes"][change["change"]] = changelist_record(change_number, change["user"], int(change["time"]), file_count)
+                progress_bar.make_progress()
+
+            self.logger.log(f"Fetched {len(changes)} new changelists.")
+
+            cache["change"] = head_change
+            igby_lib.save_cache(cache_path, cache)
+
+        self.depot_changes = cache["depot_changes"]
 
         changes_count = len(self.depot_changes)
         self.change_info_cached = changes_count > 0
         self.logger.log(f"Gathered changelist info for {changes_count} changelists.")
 
+
+    def clear_caches(self):
+
+        self.filelog = filelog_store()
+        self.file_info_cached = False
+        self.depot_changes = {}
+        self.change_info_cached = False
+        self.file_ownership = None
+        self.change_weights = {}
+
+
+    def save_cache_handoff(self, handoff_path, failed = False):
+
+        #caches built by the outer igby process are handed to the UE process through this file.
+        handoff = self.new_path_cache("handoff")
+        handoff["failed"] = failed
+
+        if not failed:
+            handoff["filelog"] = self.filelog
+            handoff["depot_changes"] = self.depot_changes
+
+        igby_lib.save_cache(handoff_path, handoff)
+
+
+    def load_cache_handoff(self, handoff_path, timeout = 3600):
+
+        #the outer igby process may still be building the caches, so wait for the handoff file.
+        start_time = time.time()
+        waiting_logged = False
+
+        while not os.path.isfile(handoff_path) and time.time() - start_time < timeout:
+
+            if not waiting_logged:
+                self.logger.log("Waiting for perforce caches from the igby process.")
+                waiting_logged = True
+
+            time.sleep(1)
+
+        handoff = self.load_path_cache(handoff_path, "handoff")
+
+        if handoff == None or handoff["failed"]:
+            self.logger.log("Perforce cache handoff is not available.", "warning_clr")
+            return False
+
+        self.clear_caches()
+        self.filelog = handoff["filelog"]
+        self.file_info_cached = self.filelog.file_count() > 0
+        self.depot_changes = handoff["depot_changes"]
+        self.change_info_cached = len(self.depot_changes) > 0
+        self.logger.log(f"Loaded perforce caches for {self.filelog.file_count()} files and {len(self.depot_changes)} changelists.")
+
+        return True
+
+
+    def get_cache_service_authkey(self):
+
+        #random secret shared by the service and its clients. Connections unpickle what they receive, so the key must not be
+        #derivable from the port or client name and is kept out of the shared cache dir. %LOCALAPPDATA% is only accessible
+        #by the current user on windows. Elsewhere the file mode restricts it to the current user.
+        key_dir = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "Igby")
+        key_path = os.path.join(key_dir, f"{self.p4.client}_cache_service.key")
+
+        if not os.path.isdir(key_dir):
+            os.makedirs(key_dir, 0o700)
+
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_bytes(32))
+
+        except FileExistsError:
+            pass
+
+        with open(key_path, "rb") as f:
+            authkey = f.read()
+
+        #a key that is still being written by another process is read again.
+        while len(authkey) < 32:
+            time.sleep(0.1)
+
+            with open(key_path, "rb") as f:
+                authkey = f.read()
+
+        return authkey
+
+
+    def load_cache_service(self, path):
+
+        if self.cache_service_port == 0:
+            return False
+
+        self.logger.log(f"Requesting perforce caches from the cache service for: {path}")
+
+        try:
+
+            with Client(("localhost", self.cache_service_port), authkey=self.get_cache_service_authkey()) as connection:
+                connection.send({"request":"caches", "path":path})
+                path_cache = connection.recv()
+
+        except (OSError, EOFError, AuthenticationError):
+
+            self.logger.log(f"Perforce cache service is not available on port {self.cache_service_port}.", "warning_clr")
+            return False
+
+        if "error" in path_cache:
+            self.logger.log(f"Perforce cache service error: {path_cache['error']}", "warning_clr")
+            return False
+
+        if path_cache.get("version") != self.cache_version or path_cache.get("port") != self.p4.port or path_cache.get("client") != self.p4.client:
+            self.logger.log("Perforce cache service caches don't match this server or client.", "warning_clr")
+            return False
+
+        self.clear_caches()
+        self.filelog = path_cache["filelog"]
+        self.file_info_cached = self.filelog.file_count() > 0
+        self.depot_changes = path_cache["depot_changes"]
+        self.change_info_cached = len(self.depot_changes) > 0
+        self.logger.log(f"Loaded perforce caches for {self.filelog.file_count()} files and {len(self.depot_changes)} changelists up to changelist {path_cache['change']}.")
+
+        return True
+
+
+    def prefetch_change_descriptions(self, changelist_numbers):
+
+        #fetch full descriptions of many changelists with as few changes commands as possible.
+        changelist_numbers = [x for x in set([str(x) for x in changelist_numbers]) if x not in self.change_descriptions]
+
+        for i in range(0, len(changelist_numbers), self.batch_size):
+
+            batch = changelist_numbers[i:i + self.batch_size]
+
+            with self.p4.at_exception_level(P4.RAISE_ERROR):
+                changes = self.p4.run_changes("-l", [f"//...@={x}" for x in batch])
+
+            for change in changes:
+                self.change_descriptions[change["change"]] = change["desc"]
+
+            #changelists that are not returned are not requested again one by one.
+            for changelist_number in batch:
+                self.change_descriptions.setdefault(changelist_number, "")
+
+
+    def get_change_description(self, changelist_number):
+
+        changelist_number = str(changelist_number)
+
+        if changelist_number not in self.change_descriptions:
+            self.change_descriptions[changelist_number] = self.get_changelist_description(changelist_number)
+
+        return self.change_descriptions[changelist_number]
+
     
     def get_filelog(self, path):
 
@@ -199,8 +580,8 @@ class p4_helper:
 
             path_l = self.convert_to_depot_path(path)
 
-            if path_l in self.depot_filelog:
-                filelog = self.depot_filelog[path_l]
+            if self.filelog.has_file(path_l):
+                filelog = [self.filelog.get_depot_file(path_l)]
         
         if filelog == None:
 
@@ -228,6 +609,47 @@ class p4_helper:
             results = self.p4.run("sync", "-q", path)
 
         return results
+
+
+    def sync_paths(self, paths):
+
+        results = []
+
+        if len(paths) == 0:
+            return results
+
+        #a single sync of all paths lets the server transfer the files over parallel threads when net.parallel.max allows it.
+        if self.parallel_sync_supported and self.parallel_connections > 1:
+
+            try:
+
+                with self.p4.at_exception_level(P4.RAISE_ERROR):
+                    results = self.p4.run("sync", "-q", f"--parallel=threads={self.parallel_connections}", *paths)
+
+                if any("net.parallel" in str(warning) for warning in self.p4.warnings):
+                    self.logger.log("Parallel file transfer is not enabled on the server. Syncing over separate connections from now on.", "warning_clr")
+                    self.parallel_sync_supported = False
+
+                return results
+
+            except P4Exception:
+
+                if not any("parallel" in str(error).lower() for error in self.p4.errors):
+                    raise
+
+                self.logger.log("Parallel file transfer is not available. Syncing over separate connections.", "warning_clr")
+                self.parallel_sync_supported = False
+
+        #sync each path over its own connection.
+        def sync_path(p4, path):
+
+            with p4.at_exception_level(P4.RAISE_ERROR):
+                return p4.run("sync", "-q", path)
+
+        for path_results in self.run_parallel(sync_path, paths):
+            results.extend(path_results)
+
+        return results
     
 
     def get_file_history(self, path):
@@ -243,9 +665,11 @@ class p4_helper:
 
         if self.is_file_in_depot(path) and not self.is_file_available_for_checkout(path):
 
-            fstat = self.p4.run('fstat', path)[0]
+            fstat = self.get_file_status(path)
 
-            if 'actionOwner' in fstat:
+            if fstat == None:
+                owner = None
+            elif 'actionOwner' in fstat:
                 owner = fstat['actionOwner']
             else:
                 if 'otherOpen' in fstat:
@@ -268,45 +692,12 @@ class p4_helper:
         last_user = None
         best_user = None
 
-        if self.is_file_in_depot(path):
-
-            filelog = self.get_filelog(path)
-
-            if len(filelog):
-
-                if mode == "last" or mode == "both":
-
-                    last_user = filelog[0].revisions[0].user
-
-                if mode == "best" or mode == "both":
-
-                    users = dict()
-                    cur_time = datetime.datetime.timestamp(datetime.datetime.now())
-
-                    for rev in filelog[0].revisions:
-                        #ignore users
-                        #ignore changelist hashtag
-                        #ignore changelist numbers
-
-                        #cl file count
-                        cl_file_count = len(self.changelist_files[rev.change])
-                        cl_file_count_w = pow((1.0/cl_file_count),0.5)
-
-                        #elapsed time
-                        file_time = datetime.datetime.timestamp(rev.time)
-                        elapsed_time = cur_time - file_time
-                        elapsed_time_d = max((elapsed_time / 86400.0), 1.0)
-                        elapsed_time_d_w = pow((1.0/elapsed_time_d),0.5)
-
-                        weight = (cl_file_count_w + elapsed_time_d_w)
+        ownership = self.get_file_ownership(path)
 
-                        if rev.user in users:
-                            users[rev.user] += weight
-                        else:
-                            users[rev.user] = weight
+        if ownership != None:
 
-                    users_sorted = sorted(users.items(), key=lambda x:x[1])
-                    best_user = users_sorted[-1][0]
+            last_user = ownership[0]
+            best_user = ownership[1]
 
         if mode == "last":
             user = last_user
@@ -325,15 +716,16 @@ class p4_helper:
 
         last_date = None
 
-        if self.is_file_in_depot(path):
+        ownership = self.get_file_ownership(path)
 
-            filelog = self.get_filelog(path)
+        if ownership != None:
 
-            if len(filelog):
-                if mode == "last":
-                    last_date = filelog[0].revisions[0].time
-                elif mode == "first":
-                    last_date = filelog[0].revisions[-1].time
+            if mode == "last":
+                last_date = ownership[3]
+            elif mode == "first":
+                last_date = ownership[2]
+
+            last_date = datetime.datetime.utcfromtimestamp(last_date)
 
             if format:
                 last_date = last_date.strftime("%Y/%m/%d %H:%M")
@@ -341,6 +733,122 @@ class p4_helper:
                 last_date = datetime.datetime.timestamp(last_date)
 
         return last_date
+
+
+    def build_ownership_table(self):
+
+        self.logger.log("Building file ownership table.")
+
+        cur_time = datetime.datetime.now().timestamp()
+        self.file_ownership = {}
+
+        #full descriptions are only needed to match hashtags.
+        if len(self.owner_ignore_hashtags):
+            self.prefetch_change_descriptions(self.filelog.change_file_counts.keys())
+
+        progress_bar = igby_lib.long_process(self.filelog.file_count(), self.logger)
+
+        for depot_file_l in self.filelog.paths:
+
+            revisions = self.filelog.get_revisions(depot_file_l)
+
+            if len(revisions):
+                self.file_ownership[depot_file_l] = self.compute_file_ownership(revisions, cur_time)
+
+            progress_bar.make_progress()
+
+
+    def get_file_ownership(self, path):
+
+        #returns [last user, best user, first time, last time]
+        ownership = None
+
+        if self.file_ownership == None and self.file_info_cached:
+            self.build_ownership_table()
+
+        if self.file_ownership != None:
+            ownership = self.file_ownership.get(self.convert_to_depot_path(path))
+
+        #fall back to the filelog for files that are not in the ownership table.
+        if ownership == None and self.is_file_in_depot(path):
+
+            filelog = self.get_filelog(path)
+
+            if len(filelog) and len(filelog[0].revisions):
+                revisions = [(rev.change, get_epoch_time(rev.time), rev.user) for rev in filelog[0].revisions]
+                ownership = self.compute_file_ownership(revisions, datetime.datetime.now().timestamp())
+
+        return ownership
+
+
+    def compute_file_ownership(self, revisions, cur_time):
+
+        #revisions are (change, time, user) ordered from newest to oldest.
+        users = dict()
+
+        for change, file_time, user in revisions:
+
+            if self.is_revision_ignored(change, user):
+                continue
+
+            #cl file count
+            cl_file_count_w = self.get_change_weight(change)
+
+            #elapsed time
+            elapsed_time = cur_time - file_time
+            elapsed_time_d = max((elapsed_time / 86400.0), 1.0)
+            elapsed_time_d_w = pow((1.0/elapsed_time_d),0.5)
+
+            weight = (cl_file_count_w + elapsed_time_d_w)
+
+            if user in users:
+                users[user] += weight
+            else:
+                users[user] = weight
+
+        last_user = revisions[0][2]
+
+        #if every revision is ignored the last user is the best guess.
+        if len(users):
+            users_sorted = sorted(users.items(), key=lambda x:x[1])
+            best_user = users_sorted[-1][0]
+        else:
+            best_user = last_user
+
+        ownership = [last_user, best_user, revisions[-1][1], revisions[0][1]]
+
+        return ownership
+
+
+    def get_change_weight(self, change):
+
+        #weight is shared by every file in the changelist so it is only computed once.
+        if change not in self.change_weights:
+            cl_file_count = max(self.filelog.get_change_file_count(change), 1)
+            self.change_weights[change] = pow((1.0/cl_file_count),0.5)
+
+        return self.change_weights[change]
+
+
+    def is_revision_ignored(self, change, user):
+
+        #every revision of a changelist has the same user and description, so the result is kept per changelist.
+        if change not in self.ignored_changes:
+
+            ignored = user in self.owner_ignore_users or change in self.owner_ignore_changelists
+
+            if not ignored and len(self.owner_ignore_hashtags):
+
+                desc_l = self.get_change_description(change).lower()
+
+                for hashtag in self.owner_ignore_hashtags:
+                    if hashtag in desc_l:
+                        ignored = True
+                        break
+
+            self.ignored_changes[change] = ignored
+
+        return self.ignored_changes[change]
     
     
     def is_file_available_for_checkout(self, path, exclusive = True):
@@ -349,9 +857,11 @@ class p4_helper:
 
         if self.is_file_in_depot(path):
 
-            fstat = self.p4.run('fstat', path)[0]
+            fstat = self.get_file_status(path)
 
-            if exclusive and 'otherOpen' in fstat:
+            if fstat == None:
+                available = False
+            elif exclusive and 'otherOpen' in fstat:
                 available = False
             elif 'action' in fstat:
                 available = False
@@ -366,64 +876,201 @@ class p4_helper:
 
         if self.is_file_in_depot(path):
 
-            fstat = self.p4.run('fstat', path)[0]
+            fstat = self.get_file_status(path)
 
-            if 'action' in fstat:
+            if fstat != None and 'action' in fstat:
                 checked_out_by_me = True
 
         return checked_out_by_me
 
     
+    def prefetch_file_status(self, paths):
+
+        #fetch open state of many files with as few fstat commands as possible.
+        paths = list(set(paths))
+
+        for i in range(0, len(paths), self.batch_size):
+
+            batch = paths[i:i + self.batch_size]
+
+            #files that are not returned by fstat are not in the depot.
+            for path in batch:
+                self.file_status[self.convert_to_depot_path(path)] = None
+
+            with self.p4.at_exception_level(P4.RAISE_ERROR):
+                results = self.p4.run("fstat", batch)
+
+            for result in results:
+
+                if type(result) is not dict or "depotFile" not in result:
+                    continue
+
+                #only keep the fields that are needed for depot, checkout and ownership queries.
+                fstat = {key:result[key] for key in ("depotFile", "headRev", "action", "actionOwner", "otherOpen") if key in result}
+
+                self.file_status[result["depotFile"].lower()] = fstat
+
+                if "clientFile" in result:
+                    self.file_status[self.convert_to_depot_path(result["clientFile"])] = fstat
+
+
+    def get_file_status(self, path):
+
+        depot_path_l = self.convert_to_depot_path(path)
+
+        if depot_path_l not in self.file_status:
+            self.prefetch_file_status([path])
+
+        return self.file_status.get(depot_path_l)
+
+
+    def expire_file_status(self, paths = None):
+
+        #drop cached fstat results after we modify the open state of files.
+        if paths == None:
+            self.file_status = {}
+        else:
+            for path in paths:
+                self.file_status.pop(self.convert_to_depot_path(path), None)
+
+
     def is_file_in_depot(self, path):
 
+        depot_path_l = self.convert_to_depot_path(path)
+
+        if self.file_info_cached and self.filelog.has_file(depot_path_l):
+            return True
+
+        #prefetched fstat results also tell if a file has depot history.
+        if depot_path_l in self.file_status:
+            return self.file_status[depot_path_l] != None and "headRev" in self.file_status[depot_path_l]
+
         file_log = self.get_filelog(path)
         in_depot = file_log != None
 
         return in_depot
 
 
+    def get_files_in_depot(self, paths):
+
+        #batched is_file_in_depot. Files that are not in the filelog cache are looked up with one fstat per batch.
+        files_in_depot = set()
+        uncached_paths = []
+
+        for path in paths:
+
+            if self.file_info_cached and self.filelog.has_file(self.convert_to_depot_path(path)):
+                files_in_depot.add(path)
+            else:
+                uncached_paths.append(path)
+
+        self.prefetch_file_status([path for path in uncached_paths if self.convert_to_depot_path(path) not in self.file_status])
+
+        for path in uncached_paths:
+
+            if self.is_file_in_depot(path):
+                files_in_depot.add(path)
+
+        return files_in_depot
+
+
     def convert_to_depot_path(self, path):
 
-        path_l = path.lower()
+        #the same paths are converted many times per run.
+        path_l = self.depot_paths.get(path)
 
-        if not path_l.startswith("//"):
-            path_l = path_l.replace("\\","/")
-            path_l = path_l.replace(self.client_root_l, self.depot_root_l)
+        if path_l == None:
+
+            path_l = path.lower()
+
+            if not path_l.startswith("//"):
+                path_l = path_l.replace("\\","/")
+                path_l = path_l.replace(self.client_root_l, self.depot_root_l)
+
+            self.depot_paths[path] = path_l
         
         return path_l
 
     
     def check_out_file(self, path, changelist_number = 0):
 
-        checked_out = False
+        checked_out = self.check_out_files([path], changelist_number)[path]
 
-        if self.is_file_in_depot(path):
+        return checked_out
 
-            changelist_number = str(changelist_number)
 
-            result = self.p4.run("edit", "-c", changelist_number, path)
+    def check_out_files(self, paths, changelist_number = 0):
 
-            if result[0]['action'] == 'edit':
-                checked_out = True
+        checked_out = self.run_file_action("edit", paths, changelist_number)
 
         return checked_out
 
 
     def mark_for_delete(self, path, changelist_number = 0):
 
-        marked_for_delete = False
+        marked_for_delete = self.mark_files_for_delete([path], changelist_number)[path]
 
-        if self.is_file_in_depot(path):
+        return marked_for_delete
 
-            changelist_number = str(changelist_number)
 
-            result = self.p4.run("delete", "-c", changelist_number, path)
+    def mark_files_for_delete(self, paths, changelist_number = 0):
 
-            if result[0]['action'] == 'delete':
-                marked_for_delete = True
+        marked_for_delete = self.run_file_action("delete", paths, changelist_number)
 
         return marked_for_delete
 
+
+    def run_file_action(self, action, paths, changelist_number = None):
+
+        expected_actions = {"edit":["edit"], "delete":["delete"]}
+
+        #result for each of the provided paths.
+        results = dict.fromkeys(paths, False)
+
+        files_in_depot = self.get_files_in_depot(results.keys())
+        action_paths = [path for path in results.keys() if path in files_in_depot]
+
+        depot_paths = {self.convert_to_depot_path(path):path for path in action_paths}
+
+        args = [action]
+
+        if changelist_number != None:
+            args.extend(["-c", str(changelist_number)])
+
+        for i in range(0, len(action_paths), self.batch_size):
+
+            batch = action_paths[i:i + self.batch_size]
+
+            #results are collected as they arrive, so that a file that fails doesn't lose the results of the rest of the batch.
+            handler = file_action_handler()
+
+            try:
+                with self.p4.using_handler(handler), self.p4.at_exception_level(P4.RAISE_ERROR):
+                    self.p4.run(*args, batch)
+
+            except P4Exception as e:
+                self.logger.log(f"Perforce {action} failed for some files: {e}", "warning_clr")
+
+            self.expire_file_status(batch)
+
+            for result in handler.results:
+
+                if type(result) is not dict or result.get("action") not in expected_actions[action]:
+                    continue
+
+                path = None
+
+                if "clientFile" in result:
+                    path = depot_paths.get(self.convert_to_depot_path(result["clientFile"]))
+
+                if path == None and "depotFile" in result:
+                    path = depot_paths.get(result["depotFile"].lower())
+
+                if path != None:
+                    results[path] = True
+
+        return results
+
     #Changelist functions
 
 
@@ -440,6 +1087,43 @@ class p4_helper:
 
         have_changelist_number = 0
 
+        result = self.p4.run_changes("-m1", f"{self.get_recursive_path(path)}#have")
+        have_changelist_number = result[0]["change"]
+
+        return have_changelist_number
+
+
+    def get_highest_have_changelist_number(self, paths):
+
+        #changes -m1 over all paths returns the highest changelist in a single query.
+        have_changelist_number = 0
+
+        if len(paths):
+
+            result = self.p4.run_changes("-m1", *[f"{self.get_recursive_path(path)}#have" for path in paths])
+
+            if len(result):
+                have_changelist_number = int(result[0]["change"])
+
+        return have_changelist_number
+
+
+    def get_highest_head_changelist_number(self, paths):
+
+        head_changelist_number = 0
+
+        if len(paths):
+
+            result = self.p4.run_changes("-m1", "-s", "submitted", *[self.get_recursive_path(path) for path in paths])
+
+            if len(result):
+                head_changelist_number = int(result[0]["change"])
+
+        return head_changelist_number
+
+
+    def get_recursive_path(self, path):
+
         if "\\" in path and not path.endswith("\\"):
 
             path += "\\"
@@ -448,12 +1132,9 @@ class p4_helper:
 
             path += "/"
 
-        path += "...#have"
+        path += "..."
 
-        result = self.p4.run_changes("-m1", path)
-        have_changelist_number = result[0]["change"]
-
-        return have_changelist_number
+        return path
 
 
     def get_client_changelists(self):
@@ -472,15 +1153,36 @@ class p4_helper:
         changelist_number = str(changelist_number)
         files = self.p4.run('opened','-c', changelist_number)
         changelist_files = []
+        depot_files_to_resolve = []
+        client_prefix = f"//{self.p4.client}/"
 
+        #opened reports files in client syntax which maps directly onto the client root.
         for file in files:
 
-            where = self.p4.run_where(file['depotFile'])
-            changelist_files.append(where[0]['path'])
+            client_file = file.get('clientFile', "")
+
+            if client_file.lower().startswith(client_prefix.lower()):
+                changelist_files.append(os.path.normpath(f"{self.client_root}/{client_file[len(client_prefix):]}"))
+            else:
+                depot_files_to_resolve.append(file['depotFile'])
+
+        #resolve anything else with batched where commands.
+        for i in range(0, len(depot_files_to_resolve), self.batch_size):
+
+            where = self.p4.run_where(depot_files_to_resolve[i:i + self.batch_size])
+            changelist_files.extend([x['path'] for x in where if type(x) is dict and 'path' in x])
 
         return changelist_files
 
 
+    def has_changelist_files(self, changelist_number):
+
+        changelist_number = str(changelist_number)
+        files = self.p4.run('opened', '-m', '1', '-c', changelist_number)
+
+        return len(files) > 0
+
+
     def set_changelist_description(self, changelist_number, description):
 
         changelist_number = str(changelist_number)
@@ -501,15 +1203,16 @@ class p4_helper:
     def revert_changelist_files(self, changelist_number, only_revert_unchanged = False):
 
         changelist_number = str(changelist_number)
-        files = self.get_changelist_files(changelist_number)
 
-        if len(files):
+        if self.has_changelist_files(changelist_number):
 
             if(only_revert_unchanged):
                 result = self.p4.run("revert", "-a", "-c", changelist_number, "//...")
             else:
                 result = self.p4.run("revert", "-c", changelist_number, "//...")
 
+            self.expire_file_status()
+
         else:
             result = None
 
@@ -534,6 +1237,7 @@ class p4_helper:
 
         if self.get_changelist_status(changelist_number) == "pending":
             result = self.p4.run_submit( "-c", changelist_number )
+            self.expire_file_status()
         else:
             result = None
 
@@ -577,4 +1281,254 @@ class p4_helper:
 
         local_files = [x["path"].replace("\\","/") for x in files]
 
-        return local_files
\ No newline at end of file
+        return local_files
+
+
+    def get_have_file_map(self, paths):
+
+        #maps lowercase depot paths to the local paths of the files in the have list.
+        have_files = {}
+
+        with self.p4.at_exception_level(P4.RAISE_ERROR):
+
+            for i in range(0, len(paths), self.batch_size):
+
+                for have in self.p4.run("have", paths[i:i + self.batch_size]):
+                    have_files[have["depotFile"].lower()] = have["path"].replace("\\","/")
+
+        return have_files
+
+
+    def get_changed_depot_files(self, path, from_change, to_change):
+
+        #depot files with revisions submitted in the changelist range, including deleted files.
+        path = f"{path}/...@{from_change},@{to_change}".replace("\\","/")
+
+        with self.p4.at_exception_level(P4.RAISE_ERROR):
+            files = self.p4.run("files", path)
+
+        depot_files = [x["depotFile"] for x in files]
+
+        return depot_files
+
+
+def get_epoch_time(utc_time):
+
+    epoch_time = int(utc_time.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+    return epoch_time
+
+
+#P4 connection that reports authentication errors so that the cached login state can be refreshed.
+class p4_connection(P4):
+
+    #error messages that mean the ticket is no longer valid.
+    auth_errors = ["p4passwd", "session has expired", "please login again", "password invalid"]
+
+    def __init__(self, *args, **kwargs):
+
+        P4.__init__(self, *args, **kwargs)
+        self.auth_error_callback = None
+
+    def run(self, *args, **kargs):
+
+        try:
+            return P4.run(self, *args, **kargs)
+
+        except P4Exception:
+
+            errors = " ".join([str(error) for error in self.errors]).lower()
+
+            if self.auth_error_callback and any(auth_error in errors for auth_error in self.auth_errors):
+                self.auth_error_callback()
+
+            raise
+
+
+#compact filelog cache. Users and depot paths are interned and every file keeps its revisions
+#in a single array of (change, time, user id) triplets ordered from newest to oldest.
+class filelog_store:
+
+    def __init__(self):
+
+        self.users = []
+        self.user_ids = {}
+        self.paths = []
+        self.path_ids = {}
+        self.revisions = []
+        self.change_descs = {}
+        self.change_file_counts = {}
+
+    def intern_user(self, user):
+
+        user_id = self.user_ids.get(user)
+
+        if user_id == None:
+            user_id = len(self.users)
+            self.users.append(user)
+            self.user_ids[user] = user_id
+
+        return user_id
+
+    def add_revisions(self, depot_file_l, revisions, from_change = 0):
+
+        #revisions are (change, time, user, desc) ordered from newest to oldest.
+        new_revisions = array.array("q")
+
+        for change, time, user, desc in revisions:
+
+            if change <= from_change:
+                continue
+
+            new_revisions.extend((change, time, self.intern_user(user)))
+            self.change_file_counts[change] = self.change_file_counts.get(change, 0) + 1
+
+            if change not in self.change_descs:
+                self.change_descs[change] = desc or ""
+
+        path_id = self.path_ids.get(depot_file_l)
+
+        if path_id == None:
+            self.path_ids[depot_file_l] = len(self.paths)
+            self.paths.append(depot_file_l)
+            self.revisions.append(new_revisions)
+        else:
+            self.revisions[path_id] = new_revisions + self.revisions[path_id]
+
+    def merge(self, other):
+
+        for depot_file_l in other.paths:
+
+            revisions = [(change, time, user, other.change_descs.get(change)) for change, time, user in other.get_revisions(depot_file_l)]
+            from_change = 0
+
+            #files shared by both stores only take revisions that are not already present.
+            #a file can have no revisions when all of them were filtered out by add_revisions.
+            if self.has_file(depot_file_l) and len(self.revisions[self.path_ids[depot_file_l]]):
+                from_change = self.revisions[self.path_ids[depot_file_l]][0]
+
+            self.add_revisions(depot_file_l, revisions, from_change)
+
+    def file_count(self):
+
+        return len(self.paths)
+
+    def has_file(self, depot_file_l):
+
+        return depot_file_l in self.path_ids
+
+    def get_revisions(self, depot_file_l):
+
+        #returns (change, time, user) tuples ordered from newest to oldest.
+        revisions = []
+        path_id = self.path_ids.get(depot_file_l)
+
+        if path_id != None:
+            file_revisions = self.revisions[path_id]
+            revisions = [(file_revisions[i], file_revisions[i+1], self.users[file_revisions[i+2]]) for i in range(0, len(file_revisions), 3)]
+
+        return revisions
+
+    def get_depot_file(self, depot_file_l):
+
+        #rebuilds a P4 filelog object for callers that expect get_filelog results.
+        depot_file = DepotFile(depot_file_l)
+
+        for change, time, user in self.get_revisions(depot_file_l):
+
+            rev = depot_file.new_revision()
+            rev.change = change
+            rev.time = datetime.datetime.utcfromtimestamp(time)
+            rev.user = user
+            rev.desc = self.get_change_desc(change)
+
+        return depot_file
+
+    def get_change_desc(self, change):
+
+        return self.change_descs.get(change, "")
+
+    def get_change_file_count(self, change):
+
+        return self.change_file_counts.get(change, 0)
+
+
+#P4 output handler that streams filelog records into a filelog_store.
+class filelog_cache_handler(OutputHandler):
+
+    progress_interval = 1000
+
+    def __init__(self, store, from_change, logger, lock):
+
+        OutputHandler.__init__(self)
+        self.store = store
+        self.from_change = from_change
+        self.logger = logger
+        self.lock = lock
+        self.record_count = 0
+        self.revision_count = 0
+
+    def outputStat(self, h):
+
+        if "depotFile" in h:
+
+            revisions = [(int(h["change"][n]), int(h["time"][n]), h["user"][n], h["desc"][n]) for n in range(len(h["rev"]))]
+
+            with self.lock:
+
+                self.store.add_revisions(h["depotFile"].lower(), revisions, self.from_change)
+
+                self.record_count += 1
+                self.revision_count += len(revisions)
+
+                if self.record_count % self.progress_interval == 0:
+                    self.log_progress()
+
+        return OutputHandler.HANDLED
+
+    def log_progress(self):
+
+        self.logger.log(f"Received filelog records for {self.record_count} files ({self.revision_count} revisions)\r", "normal_clr", True, False)
+
+
+#P4 output handler that keeps the tagged results of a command, so that they survive an exception raised for some of its files.
+class file_action_handler(OutputHandler):
+
+    def __init__(self):
+
+        OutputHandler.__init__(self)
+        self.results = []
+
+    def outputStat(self, h):
+
+        self.results.append(h)
+
+        return OutputHandler.HANDLED
+
+
+#compact changelist info kept in the changelist cache. Supports the same key lookups as p4 changes results.
+class changelist_record:
+
+    __slots__ = ("change", "user", "time", "file_count")
+
+    def __init__(self, change, user, time, file_count):
+
+        self.change = change
+        self.user = user
+        self.time = time
+        self.file_count = file_count
+
+    def __getitem__(self, key):
+
+        if key not in self.__slots__:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def __getstate__(self):
+
+        return (self.change, self.user, self.time, self.file_count)
+
+    def __setstate__(self, state):
+
+        self.change, self.user, self.time, self.file_count = state
\ No newline at end of file
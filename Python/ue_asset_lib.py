@@ -2,7 +2,7 @@
 # Developed by Richard Greenspan | rg.igby@gmail.com
 # Licensed under the MIT license. See LICENSE file in the project root for details.
 
-import unreal, os, igby_lib
+import unreal, os, time, igby_lib, random, dependency_graph_lib
 
 try:
     getattr(unreal, "EditorAssetLibrary")
@@ -132,6 +132,18 @@ def get_package_connections(package_name, type = "referencers", soft_refs = Fals
 
         raise Exception("type parameter should be either \"referencers\" or \"dependencies\"")
 
+    #answer from the dependency graph snapshot when it is enabled.
+    graph = get_dependency_graph()
+
+    if graph != None:
+        connections = graph.get_connections(package_name, type == "referencers", soft_refs, hard_refs, recursive)
+        return [unreal.Name(x) for x in connections]
+
+    return get_live_package_connections(package_name, type, soft_refs, hard_refs, recursive)
+
+
+def get_live_package_connections(package_name, type = "referencers", soft_refs = False, hard_refs = True, recursive = True):
+
     referencers = False
     if type == "referencers":
         referencers = True
@@ -200,12 +212,396 @@ def assets_class_only_test(assets, class_name):
     return True
 
 
+def get_content_dir():
+
+    global content_dir
+
+    if content_dir == None:
+        rel_content_path = unreal.Paths.project_content_dir()
+        content_dir = unreal.Paths.convert_relative_path_to_full(rel_content_path)
+
+    return content_dir
+
+
+def get_package_file_index():
+
+    #lowercase package name -> (file extension, disk size) of every package on disk. Built once from the content manifest.
+    global package_file_index
+
+    if package_file_index == None:
+
+        package_file_index = {}
+        content_manifest = igby_lib.get_content_manifest(get_content_dir())
+
+        for file_path, size, mtime in content_manifest.get_files():
+
+            package_path, extension = os.path.splitext(content_manifest.get_rel_path(file_path))
+
+            if extension.lower() == ".uasset" or extension.lower() == ".umap":
+                package_file_index[f"/game/{package_path.lower()}"] = (extension, size)
+
+    return package_file_index
+
+
+def invalidate_package_caches():
+
+    #called after packages were saved or deleted. get_content_manifest rescans the content when the index is built again.
+    global package_file_index, dependency_graph_snapshot, dependency_graph_changelist
+
+    package_file_index = None
+
+    #the content no longer matches the synced changelist, so the rebuilt graph isn't saved.
+    dependency_graph_snapshot = None
+    dependency_graph_changelist = 0
+
+
+content_dir = None
+package_file_index = None
+package_file_index_trusted = True
+
+
+def get_dependency_graph():
+
+    global dependency_graph_snapshot, dependency_graph_failed
+
+    if not dependency_graph_enabled or dependency_graph_failed:
+        return None
+
+    if dependency_graph_snapshot == None:
+
+        logger = igby_lib.logger()
+        graph = None
+        graph_path = ""
+
+        #graphs are saved per synced changelist and reused until the content changes.
+        if dependency_graph_changelist > 0:
+
+            engine_version = unreal.SystemLibrary.get_engine_version()
+            graph_path = dependency_graph_lib.get_graph_path(get_content_dir(), dependency_graph_changelist, "", engine_version)
+            graph = dependency_graph_lib.load_graph(graph_path)
+
+            if graph != None:
+                logger.log(f"Loaded dependency graph of changelist {dependency_graph_changelist} with {graph.node_count} packages.")
+
+        if graph == None:
+
+            previous_graph = None
+
+            build_time = 0
+
+            #the graph of an older changelist only needs the packages changed since then to be queried again.
+            if graph_path != "" and dependency_graph_p4 != None:
+
+                previous_graph_path = dependency_graph_lib.get_previous_graph_path(get_content_dir(), dependency_graph_changelist, "", engine_version)
+
+                if previous_graph_path != "":
+                    previous_graph = dependency_graph_lib.load_graph(previous_graph_path)
+
+            #only project content changes are tracked by changelist, so plugin and engine content is picked up by a periodic full rebuild.
+            if previous_graph != None and time.time() - previous_graph.build_time >= dependency_graph_full_rebuild_hours * 3600:
+                logger.log(f"Dependency graph is older than {dependency_graph_full_rebuild_hours} hours.")
+                previous_graph.close()
+                previous_graph = None
+
+            if previous_graph != None:
+
+                logger.log(f"Updating dependency graph from changelist {previous_graph.changelist} to {dependency_graph_changelist}.")
+                dependencies = previous_graph.get_dependencies()
+                build_time = previous_graph.build_time
+                changed_package_names = get_changed_package_names(dependency_graph_p4, previous_graph.changelist, dependency_graph_changelist)
+                previous_graph.close()
+                update_registry_dependencies(dependencies, changed_package_names, logger)
+
+            else:
+
+                logger.log("Building dependency graph snapshot.")
+                dependencies = get_registry_dependencies(logger)
+
+            graph_data = dependency_graph_lib.pack_graph(dependencies, dependency_graph_changelist, build_time)
+
+            if graph_path != "":
+                dependency_graph_lib.save_graph(graph_path, graph_data)
+
+            graph = dependency_graph_lib.csr_graph(graph_data)
+
+        if dependency_graph_verify_samples > 0 and not verify_dependency_graph(graph, dependency_graph_verify_samples, logger):
+            logger.log("Dependency graph snapshot doesn't match the asset registry. Using live asset registry queries.", "warning_clr")
+            dependency_graph_failed = True
+            return None
+
+        dependency_graph_snapshot = graph
+
+    return dependency_graph_snapshot
+
+
+def get_registry_dependencies(logger):
+
+    #returns package name -> {dependency package name: edge flags} for every package in the asset registry.
+    asset_registry = unreal.AssetRegistryHelpers.get_asset_registry()
+    hard_options, soft_options = get_registry_dependency_options()
+    package_names = sorted(set([str(asset.package_name) for asset in asset_registry.get_all_assets(True)]))
+    dependencies = {}
+
+    progress_bar = igby_lib.long_process(len(package_names), logger)
+
+    #referencers are the reverse of the dependencies, so only dependencies are queried.
+    for package_name in package_names:
+
+        dependencies[package_name] = get_registry_package_dependencies(asset_registry, package_name, hard_options, soft_options)
+        progress_bar.make_progress()
+
+    return dependencies
+
+
+def update_registry_dependencies(dependencies, changed_package_names, logger):
+
+    #queries the dependencies of changed packages again. Referencers are rebuilt from the dependencies when the graph is packed.
+    asset_registry = unreal.AssetRegistryHelpers.get_asset_registry()
+    hard_options, soft_options = get_registry_dependency_options()
+    package_names = {x.lower():x for x in dependencies.keys()}
+
+    logger.log(f"Updating dependencies of {len(changed_package_names)} changed packages.")
+
+    for changed_package_name in changed_package_names:
+
+        package_name = package_names.get(changed_package_name.lower())
+
+        if package_name != None:
+            del dependencies[package_name]
+
+        assets = asset_registry.get_assets_by_package_name(changed_package_name, True)
+
+        #deleted packages only remain in the graph while other packages still depend on them.
+        if len(assets):
+            package_name = str(assets[0].package_name)
+            dependencies[package_name] = get_registry_package_dependencies(asset_registry, package_name, hard_options, soft_options)
+
+
+def get_registry_dependency_options():
+
+    #options for the hard and soft package dependencies. Built once per graph build instead of once per package.
+    hard_options = unreal.AssetRegistryDependencyOptions(include_soft_package_references = False, include_hard_package_references = True, include_searchable_names=False, include_soft_management_references=False, include_hard_management_references=False)
+    soft_options = unreal.AssetRegistryDependencyOptions(include_soft_package_references = True, include_hard_package_references = False, include_searchable_names=False, include_soft_management_references=False, include_hard_management_references=False)
+
+    return hard_options, soft_options
+
+
+def get_registry_package_dependencies(asset_registry, package_name, hard_options, soft_options):
+
+    package_dependencies = {}
+
+    for dependency in asset_registry.get_dependencies(package_name, hard_options) or []:
+        package_dependencies[str(dependency)] = package_dependencies.get(str(dependency), 0) | dependency_graph_lib.hard_edge
+
+    for dependency in asset_registry.get_dependencies(package_name, soft_options) or []:
+        package_dependencies[str(dependency)] = package_dependencies.get(str(dependency), 0) | dependency_graph_lib.soft_edge
+
+    return package_dependencies
+
+
+def get_changed_package_names(p4, from_changelist, to_changelist):
+
+    #package names of the .uasset and .umap files submitted under the content dir after from_changelist.
+    content_dir = get_content_dir().rstrip("/\\")
+    content_depot_path = f"{p4.convert_to_depot_path(content_dir)}/"
+    package_names = []
+
+    for depot_file in p4.get_changed_depot_files(content_dir, from_changelist + 1, to_changelist):
+
+        depot_file_l = depot_file.lower()
+
+        if depot_file_l.startswith(content_depot_path):
+
+            package_path, extension = os.path.splitext(depot_file[len(content_depot_path):])
+
+            if extension.lower() == ".uasset" or extension.lower() == ".umap":
+                package_names.append(f"/Game/{package_path}")
+
+    return package_names
+
+
+def get_dependency_closure_sizes(package_names, soft_refs = False, hard_refs = True):
+
+    #returns package name -> (package count, disk size) of the package and all of its recursive dependencies that are on disk.
+    package_file_index = get_package_file_index()
+    graph = get_dependency_graph()
+    closure_sizes = {}
+
+    if graph != None:
+
+        node_sizes = {}
+
+        for node_id in range(graph.node_count):
+
+            package_file = package_file_index.get(graph.get_name(node_id).lower())
+
+            if package_file != None:
+                node_sizes[node_id] = package_file[1]
+
+        target_nodes = {}
+
+        for package_name in package_names:
+
+            node_id = graph.get_node(package_name)
+
+            if node_id != -1:
+                target_nodes[node_id] = str(package_name)
+
+        edge_mask = (dependency_graph_lib.soft_edge if soft_refs else 0) | (dependency_graph_lib.hard_edge if hard_refs else 0)
+
+        for node_id, closure_size in dependency_graph_lib.get_closure_sizes(graph, node_sizes, target_nodes.keys(), edge_mask).items():
+            closure_sizes[target_nodes[node_id]] = closure_size
+
+    #packages that aren't in the graph are walked one by one.
+    for package_name in package_names:
+
+        if str(package_name) not in closure_sizes:
+
+            connections = set([str(x) for x in get_package_connections(package_name, "dependencies", soft_refs, hard_refs, True)])
+            connections.add(str(package_name))
+            sizes = [package_file_index[x.lower()][1] for x in connections if x.lower() in package_file_index]
+            closure_sizes[str(package_name)] = (len(sizes), sum(sizes))
+
+    return closure_sizes
+
+
+def get_reachable_packages(package_names, target_package_names, soft_refs = True, hard_refs = True):
+
+    #returns package name -> set of target package names that the package recursively depends on.
+    #packages that don't depend on any of the target packages are left out.
+    target_package_names = set([str(x) for x in target_package_names])
+    graph = get_dependency_graph()
+    checked_package_names = set()
+    reachable_packages = {}
+
+    if graph != None:
+
+        source_nodes = {}
+        target_nodes = [graph.get_node(x) for x in target_package_names]
+
+        for package_name in package_names:
+
+            node_id = graph.get_node(package_name)
+
+            if node_id != -1:
+                source_nodes[node_id] = str(package_name)
+
+        edge_mask = (dependency_graph_lib.soft_edge if soft_refs else 0) | (dependency_graph_lib.hard_edge if hard_refs else 0)
+
+        for node_id, reachable_nodes in dependency_graph_lib.get_reachable_nodes(graph, source_nodes.keys(), [x for x in target_nodes if x != -1], edge_mask).items():
+            reachable_packages[source_nodes[node_id]] = set([graph.get_name(x) for x in reachable_nodes])
+
+        checked_package_names.update(source_nodes.values())
+
+    #packages that aren't in the graph are walked one by one.
+    for package_name in package_names:
+
+        if str(package_name) not in checked_package_names:
+
+            checked_package_names.add(str(package_name))
+            connections = set([str(x) for x in get_package_connections(package_name, "dependencies", soft_refs, hard_refs, True)])
+            connections.discard(str(package_name))
+            reachable = connections.intersection(target_package_names)
+
+            if len(reachable):
+                reachable_packages[str(package_name)] = reachable
+
+    return reachable_packages
+
+
+def get_dependency_chain(from_package_name, to_package_name, soft_refs = True, hard_refs = True):
+
+    #returns the shortest list of package names through which from_package_name depends on to_package_name, or an empty list.
+    graph = get_dependency_graph()
+
+    if graph != None:
+
+        from_node_id = graph.get_node(from_package_name)
+        to_node_id = graph.get_node(to_package_name)
+
+        if from_node_id != -1 and to_node_id != -1:
+            edge_mask = (dependency_graph_lib.soft_edge if soft_refs else 0) | (dependency_graph_lib.hard_edge if hard_refs else 0)
+            return [unreal.Name(graph.get_name(x)) for x in graph.get_path(from_node_id, to_node_id, edge_mask)]
+
+    #without the graph the dependencies are walked breadth first from the live asset registry.
+    parents = {str(from_package_name):None}
+    package_names = [str(from_package_name)]
+
+    while len(package_names) and str(to_package_name) not in parents:
+
+        package_names_new = []
+
+        for package_name in package_names:
+
+            for dependency in get_live_package_connections(package_name, "dependencies", soft_refs, hard_refs, False):
+
+                if str(dependency) not in parents:
+                    parents[str(dependency)] = package_name
+                    package_names_new.append(str(dependency))
+
+        package_names = package_names_new
+
+    chain = []
+    package_name = str(to_package_name) if str(to_package_name) in parents else None
+
+    while package_name != None:
+        chain.insert(0, unreal.Name(package_name))
+        package_name = parents[package_name]
+
+    return chain
+
+
+def verify_dependency_graph(graph, sample_count, logger):
+
+    #compares direct hard and soft connections in both directions with live asset registry queries.
+    package_names = [graph.get_name(x) for x in range(graph.node_count)]
+    package_names = [x for x in package_names if not x.startswith("/Script/")]
+    sample = random.sample(package_names, min(sample_count, len(package_names)))
+    mismatch_count = 0
+
+    for package_name in sample:
+
+        for type in ["dependencies", "referencers"]:
+
+            for soft_refs, hard_refs in [(False, True), (True, False)]:
+
+                live_connections = set([str(x) for x in get_live_package_connections(package_name, type, soft_refs, hard_refs, False)])
+                graph_connections = set(graph.get_connections(package_name, type == "referencers", soft_refs, hard_refs, False))
+
+                if live_connections != graph_connections:
+                    mismatch_count += 1
+                    logger.log(f"Dependency graph mismatch for {type} of {package_name}. Live:{len(live_connections)} Snapshot:{len(graph_connections)}", "warning_clr")
+
+    logger.log(f"Verified dependency graph snapshot on {len(sample)} packages with {mismatch_count} mismatches.")
+
+    return mismatch_count == 0
+
+
+dependency_graph_settings_definition = {
+"UE_DEPENDENCY_GRAPH":{"type":"bool", "optional":True, "default":True, "info":"Determines if dependency queries of modules that don't modify assets are answered from a dependency graph snapshot that is built once per run."},
+"UE_DEPENDENCY_GRAPH_VERIFY_SAMPLES":{"type":"int", "optional":True, "default":0, "info":"Number of packages for which the dependency graph snapshot is compared with live asset registry queries. 0 = No verification."},
+"UE_DEPENDENCY_GRAPH_FULL_REBUILD_HOURS":{"type":"int", "optional":True, "default":24, "info":"Hours after which the dependency graph is rebuilt from the whole asset registry instead of only the packages changed in the project content. Picks up changes to plugin and engine content. 0 = Always rebuild."}
+}
+
+dependency_graph_enabled = False
+dependency_graph_failed = False
+dependency_graph_verify_samples = 0
+dependency_graph_full_rebuild_hours = 24
+dependency_graph_changelist = 0
+dependency_graph_p4 = None
+dependency_graph_snapshot = None
+
+
 def get_package_system_path(package_name):
 
-    rel_content_path = unreal.Paths.project_content_dir()
-    abs_content_path = unreal.Paths.convert_relative_path_to_full(rel_content_path)
-    package_system_path = str(package_name).replace("/Game/",abs_content_path)
+    package_system_path = str(package_name).replace("/Game/",get_content_dir())
+    package_file = get_package_file_index().get(str(package_name).lower())
+
+    #while modules that save and delete packages run, a package in the index may already be gone from the disk.
+    if package_file != None and (package_file_index_trusted or os.path.isfile(f"{package_system_path}{package_file[0]}")):
+        return f"{package_system_path}{package_file[0]}"
 
+    #packages saved since the index was built are probed on disk.
     package_system_path_with_extension = f"{package_system_path}.uasset"
 
     if not os.path.isfile(package_system_path_with_extension):
@@ -221,6 +617,12 @@ def get_package_system_path(package_name):
 
 def get_package_disk_size(package_name, unit = "b"):
 
+    package_file = get_package_file_index().get(str(package_name).lower())
+
+    #resaved packages can have a different size than the index while modules that modify assets run.
+    if package_file != None and package_file_index_trusted:
+        return igby_lib.convert_disk_size(package_file[1], unit)
+
     package_system_path = get_package_system_path(package_name)
 
     disk_size = igby_lib.get_file_disk_size(package_system_path, unit)
@@ -0,0 +1,3 @@
+@echo off
+%igby_python% "%~dp0\Python\p4_cache_service.py" %1
+pause
\ No newline at end of file